@@ -0,0 +1,443 @@
+"""
+PandaAlchemyの読込・書込処理のベンチマーク
+
+irisテーブル(examples/postgres_example/iris_table.py)と同様の列構成に、型の異なる列を加えた合成データを
+指定した行数で作成し、各読込・書込方法の処理時間(レイテンシ)、処理速度(行/秒)、ピークメモリ(RSS)を計測する。
+各計測は別プロセスで実行するため、ピークメモリは計測ごとに独立して記録される。
+
+結果はJSONで保存し、過去の結果と比較して性能の劣化(処理時間またはメモリが閾値以上増加したもの)を検出できる
+
+使用例:
+
+    # ローカルのPostgreSQLで計測し、結果を保存
+    python benchmarks/run_benchmarks.py --rows 10000 100000 1000000 --output result.json
+
+    # 計測後に過去の結果と比較(劣化があれば終了コード1)
+    python benchmarks/run_benchmarks.py --rows 10000 100000 --output new.json --baseline result.json
+
+    # 保存済の結果同士を比較
+    python benchmarks/run_benchmarks.py --compare result.json new.json
+
+接続先は引数、または環境変数(POSTGRES_USER, POSTGRES_PASSWORD, HOST_IP, POSTGRES_PORT, BENCH_DB_NAME)で指定する。
+`--backend auto`(デフォルト)でPostgreSQLに接続できない場合は、SQLiteで計測可能な処理のみ計測する
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import create_engine
+
+# ルートディレクトリ(1階層上)を読込元に追加
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from panda_alchemy import PandaAlchemy
+
+# 書込先テーブル名(読込用テーブルは行数ごとに`READ_TABLE_NAME_{行数}`で作成)
+WRITE_TABLE_NAME = 'pdalchemy_bench_write'
+READ_TABLE_NAME = 'pdalchemy_bench_read'
+# テーブル作成時の列の型(連番の主キー`id`は`create_table_from_dtype_dict`で自動作成)
+TABLE_DTYPE = {
+    'sepal_length': 'Float',
+    'sepal_width': 'Float',
+    'petal_length': 'Float',
+    'petal_width': 'Float',
+    'species': 'String',
+    'dt': 'DateTime',
+    'count': 'Integer',
+    'total': 'BigInteger',
+    'flag': 'Boolean',
+    'comment': 'String',
+}
+# データ追加・読込時の列の型
+DTYPE_DICT = dict({'id': 'Integer'}, **TABLE_DTYPE)
+SPECIES = np.array(['setosa', 'versicolor', 'virginica'], dtype=object)
+COMMENTS = np.array(['', 'short comment', 'a somewhat longer free text comment about this sample',
+                     '日本語のコメント', None], dtype=object)
+
+
+def make_frame(n_rows, seed=0):
+    """
+    irisテーブルと同様の列に、整数(NULLを含む)、真偽値、文字列(NULLを含む)の列を加えた合成データを作成
+    """
+    rng = np.random.default_rng(seed)
+    total = pd.array(rng.integers(0, 10 ** 12, n_rows), dtype='Int64')
+    total[rng.random(n_rows) < 0.1] = pd.NA
+    return pd.DataFrame({
+        'id': np.arange(1, n_rows + 1, dtype=np.int32),
+        'sepal_length': rng.normal(5.8, 0.8, n_rows).round(1),
+        'sepal_width': rng.normal(3.0, 0.4, n_rows).round(1),
+        'petal_length': rng.normal(3.8, 1.8, n_rows).round(1),
+        'petal_width': rng.normal(1.2, 0.8, n_rows).round(1),
+        'species': SPECIES[rng.integers(0, len(SPECIES), n_rows)],
+        'dt': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 365 * 86400, n_rows), unit='s'),
+        'count': rng.integers(0, 1000, n_rows).astype(np.int32),
+        'total': total,
+        'flag': rng.random(n_rows) < 0.5,
+        'comment': COMMENTS[rng.integers(0, len(COMMENTS), n_rows)],
+    })
+
+
+def make_raw_frame(n_rows, seed=0):
+    """
+    CSV等から読み込んだ直後のように、`DTYPE_DICT`と型が一致しない合成データを作成(型変換の計測用)
+    """
+    df = make_frame(n_rows, seed=seed)
+    df['id'] = df['id'].astype(np.int64)
+    df['dt'] = df['dt'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    df['count'] = df['count'].astype(np.float64)
+    df['total'] = df['total'].astype(np.float64)
+    return df
+
+
+class SQLitePandaAlchemy(PandaAlchemy):
+    """
+    PostgreSQLが使用できない環境向けに、SQLiteのファイルに接続するPandaAlchemy(`database`にファイルパスを指定)
+    """
+    def _get_engine(self, username, password, host, port, database):
+        return create_engine(f'sqlite:///{database}')
+
+
+def connect(config):
+    """
+    接続設定のdictからPandaAlchemyを作成
+    """
+    if config['backend'] == 'sqlite':
+        return SQLitePandaAlchemy(None, None, None, None, config['database'])
+    return PandaAlchemy(config['username'], config['password'], config['host'], config['port'], config['database'])
+
+
+def peak_rss_mb():
+    """
+    現在のプロセスのピークメモリ(RSS, MB)を取得(取得できない環境ではNone)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+###### 計測対象の処理 ######
+# 処理名 → (対応バックエンド, 準備内容, 最大行数, 処理を実行する関数)
+#   準備内容 "frame": 合成データを作成, "raw": 型変換前の合成データを作成, "empty": 合成データを作成し空の書込先テーブルを作成(繰返しごと),
+#            "loaded": 読込用テーブルにデータを投入済(`--rows`の行数ごとに1回)
+CASES = {}
+
+
+def case(name, backends=('postgres', 'sqlite'), setup='frame', max_rows=None):
+    def decorator(func):
+        CASES[name] = {'backends': backends, 'setup': setup, 'max_rows': max_rows, 'func': func}
+        return func
+    return decorator
+
+
+@case('convert_dtypes', setup='raw')
+def bench_convert_dtypes(pdalchemy, df, n_rows):
+    pdalchemy._convert_types(df, DTYPE_DICT)
+
+
+@case('create_table_from_df', setup='frame')
+def bench_create_table_from_df(pdalchemy, df, n_rows):
+    if pdalchemy.check_table_existence(WRITE_TABLE_NAME):
+        pdalchemy.drop_table(WRITE_TABLE_NAME)
+    pdalchemy.create_table_from_df(df, WRITE_TABLE_NAME, dtype_dict=DTYPE_DICT)
+
+
+@case('insert_to_sql', setup='empty', max_rows=1000000)
+def bench_insert_to_sql(pdalchemy, df, n_rows):
+    pdalchemy.insert_from_df(df, WRITE_TABLE_NAME, dtype_dict=DTYPE_DICT)
+
+
+@case('insert_copy', backends=('postgres',), setup='empty')
+def bench_insert_copy(pdalchemy, df, n_rows):
+    pdalchemy.insert_from_df(df, WRITE_TABLE_NAME, dtype_dict=DTYPE_DICT, method='copy')
+
+
+@case('insert_binary', backends=('postgres',), setup='empty')
+def bench_insert_binary(pdalchemy, df, n_rows):
+    pdalchemy.insert_from_df(df, WRITE_TABLE_NAME, dtype_dict=DTYPE_DICT, method='binary')
+
+
+@case('insert_parallel', backends=('postgres',), setup='empty')
+def bench_insert_parallel(pdalchemy, df, n_rows):
+    report = pdalchemy.insert_from_df_parallel(df, WRITE_TABLE_NAME, dtype_dict=DTYPE_DICT, method='copy')
+    if len(report['failed_chunks']) > 0:
+        raise Exception(f'{len(report["failed_chunks"])} chunks failed')
+
+
+@case('upsert_copy', backends=('postgres',), setup='empty')
+def bench_upsert_copy(pdalchemy, df, n_rows):
+    # 半数の行は既存行の更新、残りは新規追加
+    pdalchemy.insert_from_df(df.iloc[:n_rows // 2], WRITE_TABLE_NAME, dtype_dict=DTYPE_DICT, method='copy')
+    pdalchemy.upsert_from_df(df, WRITE_TABLE_NAME, key_columns='id', dtype_dict=DTYPE_DICT)
+
+
+@case('read_sql_query', setup='loaded')
+def bench_read_sql_query(pdalchemy, df, n_rows):
+    pdalchemy.read_sql_query(f'SELECT * FROM {READ_TABLE_NAME}_{n_rows}', dtype_dict=DTYPE_DICT)
+
+
+@case('read_sql_query_copy', backends=('postgres',), setup='loaded')
+def bench_read_sql_query_copy(pdalchemy, df, n_rows):
+    pdalchemy.read_sql_query(f'SELECT * FROM {READ_TABLE_NAME}_{n_rows}', dtype_dict=DTYPE_DICT, method='copy')
+
+
+@case('read_sql_query_stream', setup='loaded')
+def bench_read_sql_query_stream(pdalchemy, df, n_rows):
+    for _ in pdalchemy.read_sql_query(f'SELECT * FROM {READ_TABLE_NAME}_{n_rows}', dtype_dict=DTYPE_DICT,
+                                      chunksize=100000, stream=True):
+        pass
+
+
+@case('read_partitioned', backends=('postgres',), setup='loaded')
+def bench_read_partitioned(pdalchemy, df, n_rows):
+    pdalchemy.read_partitioned(f'{READ_TABLE_NAME}_{n_rows}', 'id', 4, dtype_dict=DTYPE_DICT)
+
+
+###### 計測の実行 ######
+def run_worker(spec):
+    """
+    子プロセスで1処理を計測し、結果のdictを返す
+    """
+    func = CASES[spec['case']]['func']
+    setup = CASES[spec['case']]['setup']
+    n_rows = spec['rows']
+    pdalchemy = connect(spec['config'])
+    if setup == 'raw':
+        df = make_raw_frame(n_rows)
+    elif setup in ('frame', 'empty'):
+        df = make_frame(n_rows)
+    else:
+        df = None
+    gc.collect()
+    base_rss = peak_rss_mb()
+    seconds = []
+    for _ in range(spec['repeat']):
+        if setup == 'empty':
+            if pdalchemy.check_table_existence(WRITE_TABLE_NAME):
+                pdalchemy.drop_table(WRITE_TABLE_NAME)
+            pdalchemy.create_table_from_dtype_dict(WRITE_TABLE_NAME, TABLE_DTYPE)
+        gc.collect()
+        start_time = time.perf_counter()
+        func(pdalchemy, df, n_rows)
+        seconds.append(time.perf_counter() - start_time)
+    peak_rss = peak_rss_mb()
+    if setup == 'empty':
+        pdalchemy.drop_table(WRITE_TABLE_NAME)
+    pdalchemy.engine.dispose()
+    median = statistics.median(seconds)
+    return {
+        'case': spec['case'],
+        'rows': n_rows,
+        'seconds': seconds,
+        'median_seconds': median,
+        'min_seconds': min(seconds),
+        'rows_per_sec': n_rows / max(median, 1e-9),
+        'base_rss_mb': base_rss,
+        'peak_rss_mb': peak_rss,
+        'peak_rss_delta_mb': None if peak_rss is None else peak_rss - base_rss,
+    }
+
+
+def run_case(case_name, n_rows, repeat, config):
+    """
+    1処理の計測を別プロセスで実行し、結果のdictを返す(失敗時は"error"に内容を記録)
+    """
+    spec = {'case': case_name, 'rows': n_rows, 'repeat': repeat, 'config': config}
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', json.dumps(spec)],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        # 例外の内容(トレースバックの最終行)を記録
+        lines = [line for line in proc.stderr.strip().splitlines() if line and not line.startswith(' ')]
+        errors = [line for line in lines if not line.startswith(('[', '(Background'))]
+        return {'case': case_name, 'rows': n_rows, 'error': errors[-1] if errors else proc.stderr.strip()}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def load_read_table(config, n_rows):
+    """
+    読込系の処理で使用するテーブルを作成し、合成データを投入
+    """
+    table_name = f'{READ_TABLE_NAME}_{n_rows}'
+    with contextlib.redirect_stdout(sys.stderr), connect(config) as pdalchemy:
+        if pdalchemy.check_table_existence(table_name):
+            pdalchemy.drop_table(table_name)
+        pdalchemy.create_table_from_dtype_dict(table_name, TABLE_DTYPE)
+        method = 'copy' if config['backend'] == 'postgres' else None
+        pdalchemy.insert_from_df(make_frame(n_rows), table_name, dtype_dict=DTYPE_DICT, method=method,
+                                 chunksize=None if method is not None else 100000)
+    gc.collect()
+
+
+def drop_read_tables(config, rows_list):
+    """
+    読込系の処理で使用したテーブルを削除
+    """
+    with contextlib.redirect_stdout(sys.stderr), connect(config) as pdalchemy:
+        for n_rows in rows_list:
+            if pdalchemy.check_table_existence(f'{READ_TABLE_NAME}_{n_rows}'):
+                pdalchemy.drop_table(f'{READ_TABLE_NAME}_{n_rows}')
+
+
+def resolve_config(args):
+    """
+    引数から接続設定を作成(`--backend auto`でPostgreSQLに接続できない場合はSQLite)
+    """
+    config = {'backend': args.backend, 'username': args.username, 'password': args.password,
+              'host': args.host, 'port': args.port, 'database': args.database}
+    if args.backend in ('auto', 'postgres'):
+        try:
+            with contextlib.redirect_stdout(sys.stderr), connect(dict(config, backend='postgres')) as pdalchemy:
+                with pdalchemy.engine.connect() as conn:
+                    conn.execute(sqlalchemy.text('SELECT 1'))
+            config['backend'] = 'postgres'
+        except sqlalchemy.exc.OperationalError as e:
+            if args.backend == 'postgres':
+                raise
+            print(f'PostgreSQL is not available ({str(e).splitlines()[0]}). Falling back to SQLite', file=sys.stderr)
+            config['backend'] = 'sqlite'
+    if config['backend'] == 'sqlite':
+        config['database'] = args.sqlite_path or os.path.join(tempfile.gettempdir(), 'pdalchemy_bench.sqlite')
+    return config
+
+
+def get_versions():
+    """
+    計測環境(ライブラリのバージョン等)を取得
+    """
+    versions = {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                'sqlalchemy': sqlalchemy.__version__, 'platform': platform.platform()}
+    try:
+        import psycopg2
+        versions['psycopg2'] = psycopg2.__version__
+    except ImportError:
+        versions['psycopg2'] = None
+    return versions
+
+
+def run_benchmarks(config, rows_list, case_names, repeat):
+    """
+    指定した行数・処理の組み合わせを全て計測し、結果のdictを返す
+    """
+    results = []
+    for n_rows in rows_list:
+        targets = [name for name in case_names
+                   if config['backend'] in CASES[name]['backends']
+                   and (CASES[name]['max_rows'] is None or n_rows <= CASES[name]['max_rows'])]
+        if any(CASES[name]['setup'] == 'loaded' for name in targets):
+            load_read_table(config, n_rows)
+        for name in targets:
+            result = run_case(name, n_rows, repeat, config)
+            results.append(result)
+            if 'error' in result:
+                print(f'{name:24s} {n_rows:>10d} rows  FAILED: {result["error"]}')
+            else:
+                print(f'{name:24s} {n_rows:>10d} rows  {result["median_seconds"]:9.3f} s  '
+                      f'{result["rows_per_sec"]:12.0f} rows/s  peak RSS {result["peak_rss_mb"] or 0:8.1f} MB')
+    drop_read_tables(config, rows_list)
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'backend': config['backend'],
+        'repeat': repeat,
+        'versions': get_versions(),
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold):
+    """
+    2つの計測結果を処理名・行数ごとに比較し、処理時間(中央値)またはピークメモリ(増加分)が
+    `threshold`の割合以上増加したものを劣化としてリストで返す
+    """
+    baseline_results = {(r['case'], r['rows']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for result in current['results']:
+        old = baseline_results.get((result['case'], result['rows']))
+        if old is None or 'error' in result:
+            continue
+        for key in ('median_seconds', 'peak_rss_delta_mb'):
+            if old.get(key) is None or result.get(key) is None or old[key] <= 0:
+                continue
+            ratio = result[key] / old[key] - 1
+            marker = 'REGRESSION' if ratio > threshold else ''
+            print(f'{result["case"]:24s} {result["rows"]:>10d} rows  {key:18s} '
+                  f'{old[key]:10.3f} -> {result[key]:10.3f} ({ratio:+7.1%}) {marker}')
+            if ratio > threshold:
+                regressions.append({'case': result['case'], 'rows': result['rows'], 'metric': key,
+                                    'baseline': old[key], 'current': result[key], 'ratio': ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark read/write methods of PandaAlchemy')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help='numbers of rows of the synthetic frames (e.g. 10000 100000 1000000 10000000)')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES),
+                        help='methods to benchmark (default: all methods available on the backend)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of repetitions per measurement')
+    parser.add_argument('--output', help='path of the JSON file to save the results')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare the results with')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two saved JSON files without running benchmarks')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative increase of time or memory regarded as a regression (default: 0.2)')
+    parser.add_argument('--backend', choices=['auto', 'postgres', 'sqlite'], default='auto')
+    parser.add_argument('--username', default=os.getenv('POSTGRES_USER', 'postgres'))
+    parser.add_argument('--password', default=os.getenv('POSTGRES_PASSWORD', ''))
+    parser.add_argument('--host', default=os.getenv('HOST_IP', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('POSTGRES_PORT', '5432')))
+    parser.add_argument('--database', default=os.getenv('BENCH_DB_NAME', 'postgres'))
+    parser.add_argument('--sqlite-path', help='path of the SQLite database file used by the SQLite backend')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # 子プロセスとして1処理を計測(ライブラリの表示は標準エラー出力に回し、結果のみ標準出力に出力)
+    if args.worker is not None:
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_worker(json.loads(args.worker))
+        print(json.dumps(result))
+        return 0
+
+    # 保存済の結果同士を比較
+    if args.compare is not None:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold)
+        print(f'{len(regressions)} regressions found')
+        return 1 if len(regressions) > 0 else 0
+
+    # 計測を実行
+    config = resolve_config(args)
+    print(f'Backend: {config["backend"]}')
+    current = run_benchmarks(config, args.rows, args.cases, args.repeat)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f'Results are saved to {args.output}')
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold)
+        print(f'{len(regressions)} regressions found')
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,13 @@
 from .panda_alchemy import *
+from .postgres_copy import *
+from .schema_catalog import *
+from .result_cache import *
+from .metrics import *
+from .engine_registry import *
+from .arrow_utils import *
+from .incremental_snapshot import *
+from .lazy_frame import *
+from .async_panda_alchemy import *
 from .postgres_utils import *
 
 __version__ = '0.1.0'
\ No newline at end of file
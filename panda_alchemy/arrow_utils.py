@@ -0,0 +1,286 @@
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import Float, Integer, BigInteger, SmallInteger, Boolean, String, DateTime, Date
+
+from .postgres_copy import POSTGRES_STRING_OIDS
+
+# PyArrowはArrow形式での読込時のみ必要なため、未インストールでも他の機能は使用可能とする
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as pa_dataset
+except ImportError:
+    pa = None
+    pa_csv = None
+    pa_dataset = None
+
+
+def _check_pyarrow():
+    """
+    PyArrowがインストールされているか、pandasがArrowの型(`pandas.ArrowDtype`。pandas 1.5以降)に対応しているか確認
+    """
+    if pa is None:
+        raise Exception('PyArrow is required for Arrow-backed reading. Install it with `pip install pyarrow`.')
+    if not hasattr(pd, 'ArrowDtype'):
+        raise Exception(f'Pandas >=1.5 is required for Arrow-backed reading, but pandas {pd.__version__} is installed.')
+
+
+def _postgres_arrow_type(oid):
+    """
+    PostgreSQLの型のOIDから対応するArrowの型を取得(対応がなければNoneとし、Arrow側で推定)
+    """
+    if oid in POSTGRES_STRING_OIDS:
+        return pa.string()
+    return {
+        16: pa.bool_(),                           # boolean
+        21: pa.int16(),                           # smallint
+        23: pa.int32(),                           # integer
+        20: pa.int64(),                           # bigint
+        700: pa.float32(),                        # real
+        701: pa.float64(),                        # double precision
+        1700: pa.float64(),                       # numeric
+        1082: pa.date32(),                        # date
+        1114: pa.timestamp('us'),                 # timestamp
+        1184: pa.timestamp('us', tz='UTC'),       # timestamptz(UTCで取得)
+    }.get(oid)
+
+
+def arrow_type_from_dtype(dtype):
+    """
+    dtype_dictの値("Float", "Integer"等の文字列、または`sqlalchemy.types`のメンバ)から対応するArrowの型を取得
+
+    対応するArrowの型がない`sqlalchemy.types`のメンバはNoneを返す
+    """
+    _check_pyarrow()
+    # valueが文字列、または対応する`sqlalchemy.types`メンバの時
+    if dtype == 'Float' or isinstance(dtype, Float):
+        return pa.float64()
+    elif dtype == 'BigInteger' or isinstance(dtype, BigInteger):
+        return pa.int64()
+    elif isinstance(dtype, SmallInteger):
+        return pa.int16()
+    elif dtype == 'Integer' or isinstance(dtype, Integer):
+        return pa.int32()
+    elif dtype == 'Boolean' or isinstance(dtype, Boolean):
+        return pa.bool_()
+    elif dtype == 'String' or isinstance(dtype, String):
+        return pa.string()
+    elif dtype == 'DateTime' or isinstance(dtype, DateTime):
+        return pa.timestamp('us', tz='UTC') if isinstance(dtype, DateTime) and dtype.timezone else pa.timestamp('us')
+    elif isinstance(dtype, Date):
+        return pa.date32()
+    # valueが上記以外の`sqlalchemy.types`メンバのとき、型を指定しない
+    elif isinstance(dtype, sqlalchemy.types.TypeEngine):
+        return None
+    # valueが上記以外のとき、エラーを返す
+    else:
+        raise Exception(f'Values of `dtype_dict` should be strings or members of `sqlalchemy.types`. {dtype} is not available.')
+
+
+def make_arrow_column_types(columns, dtype_dict=None, parse_dates=None, dictionary_columns=None):
+    """
+    クエリ結果の列(列名とOIDのリスト)ごとのArrowの型をdictで作成
+
+    優先順位は`dtype_dict` → `parse_dates` → DBの列の型。`dictionary_columns`の列は辞書エンコードした文字列型とする。
+    日時型を指定した列のタイムゾーンの有無はDBの列の型に合わせる(timestamptzはUTCオフセット付きで出力されるため)
+    """
+    _check_pyarrow()
+    dtype_dict = dtype_dict or {}
+    parse_dates = parse_dates or []
+    dictionary_columns = dictionary_columns or []
+    column_types = {}
+    for name, oid in columns:
+        if name in dictionary_columns:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        elif name in dtype_dict:
+            arrow_type = arrow_type_from_dtype(dtype_dict[name])
+        elif name in parse_dates:
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = _postgres_arrow_type(oid)
+        if arrow_type is not None and pa.types.is_timestamp(arrow_type) and oid in (1114, 1184):
+            arrow_type = _postgres_arrow_type(oid)
+        if arrow_type is not None:
+            column_types[name] = arrow_type
+    return column_types
+
+
+def _copy_convert_options(column_types):
+    """
+    `COPY ... TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')`の出力を読み込む際の`pyarrow.csv.ConvertOptions`を作成
+    """
+    # NULLは"\\N"で出力され、同じ文字列の値はクオートされる。真偽値は"t", "f"で出力される
+    return pa_csv.ConvertOptions(column_types=column_types, null_values=['\\N'],
+                                 strings_can_be_null=True, quoted_strings_can_be_null=False,
+                                 true_values=['t'], false_values=['f'])
+
+
+def read_copy_csv(source, column_types):
+    """
+    `COPY ... TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')`の出力を`pyarrow.csv`で読み込み、pyarrow.Tableを返す
+
+    Parameters
+    ----------
+    source : file-like object
+        `COPY`の出力(バイナリモードのファイルオブジェクト)
+
+    column_types : dict[str, pyarrow.DataType]
+        列ごとのArrowの型(`make_arrow_column_types`の出力)。指定のない列はArrow側で推定
+    """
+    _check_pyarrow()
+    return pa_csv.read_csv(source, convert_options=_copy_convert_options(column_types))
+
+
+def open_copy_csv(source, column_types, block_size=None):
+    """
+    `COPY ... TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')`の出力を`pyarrow.csv`で逐次読み込むリーダーを返す
+
+    リーダーは`block_size`バイトごとにpyarrow.RecordBatchを返すため、全体をメモリに保持せずに処理できる
+
+    Parameters
+    ----------
+    source : file-like object
+        `COPY`の出力(バイナリモードのファイルオブジェクト。パイプ等のシークできないストリームも可)
+
+    column_types : dict[str, pyarrow.DataType]
+        列ごとのArrowの型(`make_arrow_column_types`の出力)。指定のない列は先頭のブロックからArrow側で推定
+
+    block_size : int, default=None
+        1つのRecordBatchに読み込むバイト数(Noneならpyarrowのデフォルト値)
+    """
+    _check_pyarrow()
+    read_options = pa_csv.ReadOptions(block_size=block_size) if block_size is not None else None
+    return pa_csv.open_csv(source, read_options=read_options, convert_options=_copy_convert_options(column_types))
+
+
+def iter_file_batches(path, file_format=None, column_types=None, block_size=None, batch_size=None, default_type=None):
+    """
+    CSVまたはParquetファイルを逐次読み込み、pyarrow.RecordBatchを1つずつ返すジェネレータ
+
+    Parameters
+    ----------
+    path : str
+        読み込むファイルのパス
+
+    file_format : {None, "csv", "parquet"}, default=None
+        ファイル形式(Noneなら拡張子から判定。".parquet", ".pq"以外はCSV)
+
+    column_types : dict[str, pyarrow.DataType], default=None
+        列ごとのArrowの型。CSVは読込時に変換し、Parquetは読込後に変換する(変換できない値があればエラー)。指定のない列はそのまま
+
+    block_size : int, default=None
+        CSVで1つのRecordBatchに読み込むバイト数(Noneならpyarrowのデフォルト値)
+
+    batch_size : int, default=None
+        Parquetで1つのRecordBatchに読み込む行数(Noneならpyarrowのデフォルト値)
+
+    default_type : pyarrow.DataType, default=None
+        CSVで`column_types`に指定のない列の型(Noneなら先頭のブロックからArrow側で推定)。
+        推定すると先頭のブロックにない値(小数、先頭が0の数字等)を後続のブロックで変換できないため、`pa.string()`等を指定する
+    """
+    _check_pyarrow()
+    column_types = column_types or {}
+    if file_format is None:
+        file_format = 'parquet' if path.lower().endswith(('.parquet', '.pq')) else 'csv'
+    if file_format == 'csv':
+        read_options = pa_csv.ReadOptions(block_size=block_size) if block_size is not None else None
+        # 指定のない列の型を指定するとき、ヘッダから列名を取得
+        if default_type is not None:
+            with open(path, 'rb') as f:
+                names = pa_csv.open_csv(f, read_options=read_options).schema.names
+            column_types = {name: column_types.get(name, default_type) for name in names}
+        # `pandas.read_csv`と同様に、空文字列や"NA", "NULL"等は文字列型の列でも欠損値とする
+        convert_options = pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+        # パスを直接渡すとファイル全体が先読みされるため、Pythonのファイルオブジェクト経由で読み込む
+        with open(path, 'rb') as f:
+            reader = pa_csv.open_csv(f, read_options=read_options, convert_options=convert_options)
+            for batch in reader:
+                yield batch
+    elif file_format == 'parquet':
+        import pyarrow.parquet as pa_parquet
+        parquet_file = pa_parquet.ParquetFile(path)
+        # pandasのインデックスを保存した列は読み込まない
+        columns = [name for name in parquet_file.schema_arrow.names if not name.startswith('__index_level_')]
+        options = {'batch_size': batch_size} if batch_size is not None else {}
+        for batch in parquet_file.iter_batches(columns=columns, **options):
+            yield pa.RecordBatch.from_arrays(
+                [column.cast(column_types[name]) if name in column_types else column
+                 for name, column in zip(batch.schema.names, batch.columns)],
+                names=batch.schema.names)
+    else:
+        raise Exception(f'`file_format` should be None, "csv" or "parquet", but {file_format} is specified.')
+
+
+def batch_to_copy_csv(batch):
+    """
+    pyarrow.RecordBatchを`COPY ... FROM STDIN WITH (FORMAT csv)`で送信できるCSV(ヘッダなし)のバイト列に変換
+
+    欠損値はクオートなしの空文字列、文字列の値は全てクオートして出力されるため、NULLと空文字列を区別できる
+    """
+    _check_pyarrow()
+    # 辞書エンコードした列は元の型に戻して出力
+    columns = [column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+               for column in batch.columns]
+    batch = pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(batch, sink, write_options=pa_csv.WriteOptions(include_header=False))
+    return sink.getvalue().to_pybytes()
+
+
+def write_parquet_dataset(batches, schema, path, partition_by=None, rows_per_file=None,
+                          existing_data_behavior='error'):
+    """
+    pyarrow.RecordBatchのイテレータを、パーティション分割したParquetのデータセットとして逐次書込み、作成したファイルのパスのリストを返す
+
+    Parameters
+    ----------
+    batches : iterable of pyarrow.RecordBatch
+        書き込むデータ(1バッチずつ取り出して書き込む)
+
+    schema : pyarrow.Schema
+        データのスキーマ
+
+    path : str
+        出力先のディレクトリ
+
+    partition_by : list[str], default=None
+        パーティション分割に使用する列名(Hive形式の"列名=値"のディレクトリに分割。Noneなら分割しない)
+
+    rows_per_file : int, default=None
+        1ファイルの最大行数(Noneなら上限なし)
+
+    existing_data_behavior : {"error", "overwrite_or_ignore", "delete_matching"}, default="error"
+        出力先に既存のファイルがある場合の動作(`pyarrow.dataset.write_dataset`と同様)
+    """
+    _check_pyarrow()
+    files = []
+    options = {}
+    if rows_per_file is not None:
+        # 行グループはファイルの行数以下とする必要がある
+        options['max_rows_per_file'] = rows_per_file
+        options['max_rows_per_group'] = min(rows_per_file, 1024 * 1024)
+    pa_dataset.write_dataset(batches, path, schema=schema, format='parquet',
+                             partitioning=partition_by, partitioning_flavor='hive' if partition_by else None,
+                             existing_data_behavior=existing_data_behavior,
+                             file_visitor=lambda written_file: files.append(written_file.path), **options)
+    return files
+
+
+def _arrow_types_mapper(arrow_type):
+    """
+    `pyarrow.Table.to_pandas`の`types_mapper`(辞書エンコードした列はcategory型、それ以外はArrowの型のまま保持)
+    """
+    if pa.types.is_dictionary(arrow_type):
+        return None
+    return pd.ArrowDtype(arrow_type)
+
+
+def arrow_table_to_pandas(table):
+    """
+    pyarrow.Tableを、各列をArrowの型(`string[pyarrow]`, `int64[pyarrow]`等)で保持するpandas.DataFrameに変換
+
+    数値列は欠損値を含んでも浮動小数点型にならず、文字列はPythonのオブジェクトを作らずに保持される。
+    辞書エンコードした列はcategory型に変換する
+    """
+    _check_pyarrow()
+    return table.to_pandas(types_mapper=_arrow_types_mapper)
@@ -0,0 +1,291 @@
+import time
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import MetaData
+
+from .panda_alchemy import PandaAlchemy
+from .engine_registry import _make_engine_options
+from .metrics import Instrumentation
+
+
+class AsyncPandaAlchemy():
+    # `method="copy"`で1回の`COPY`に送る行数
+    COPY_CHUNKSIZE = PandaAlchemy.COPY_CHUNKSIZE
+
+    # 型変換の処理は`PandaAlchemy`と共通
+    _make_sqlalchemy_dtype = PandaAlchemy._make_sqlalchemy_dtype
+    _make_pandas_dtype = PandaAlchemy._make_pandas_dtype
+    _get_dtype_plan = PandaAlchemy._get_dtype_plan
+    _convert_dataframe_dtype = PandaAlchemy._convert_dataframe_dtype
+    _convert_types = PandaAlchemy._convert_types
+    _make_dtype_table = PandaAlchemy._make_dtype_table
+    _make_chunk_df = PandaAlchemy._make_chunk_df
+
+    # 初期化
+    def __init__(self, username, password, host, port, database, pool_size=None, max_overflow=None,
+                 pool_pre_ping=None, pool_recycle=None, statement_timeout=None):
+        """
+        asyncio用のPandasとPostgreSQLのデータ入出力用クラス(SQLAlchemyの非同期engineとasyncpgを使用)
+
+        各メソッドはコルーチンのため`await`で呼び出す。1つのコネクションプールで複数のクエリを並行実行できる
+
+        セッションが残らないよう`async with`構文での使用を推奨
+
+        記載例:
+
+        >>> async with AsyncPandaAlchemy(USERNAME, PASSWORD, HOST, PORT, DB_NAME) as pdalchemy:
+        >>>     df1, df2 = await asyncio.gather(pdalchemy.read_sql_query(sql1), pdalchemy.read_sql_query(sql2))
+
+        Parameters
+        ----------
+        username, password, host, port, database :
+            接続先(`PandaAlchemy`と同様)
+
+        pool_size, max_overflow, pool_pre_ping, pool_recycle, statement_timeout :
+            コネクションプールの設定(`PandaAlchemy`と同様)
+        """
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.database = database
+        self._engine_options = _make_engine_options(pool_size=pool_size, max_overflow=max_overflow,
+                                                    pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle)
+        # タイムアウトはasyncpgのセッション設定として指定
+        if statement_timeout is not None:
+            self._engine_options['connect_args'] = {'server_settings': {'statement_timeout': str(int(statement_timeout))}}
+        # SQLAlchemyの非同期engine作成
+        self.engine = self._get_engine(username, password, host, port, database)
+        # dtype_dictごとの型変換内容のキャッシュ
+        self._dtype_plan_cache = {}
+        # 型変換の処理で使用(非同期版では計測結果のコールバックには対応しない)
+        self.metrics = Instrumentation(self.engine.sync_engine)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exception_type, exception_value, traceback):
+        """ async withブロックから抜けたら時の処理 """
+        # エンジン破棄
+        await self.engine.dispose()
+
+    def _get_engine(self, username, password, host, port, database):
+        """
+        SQLAlchemyの非同期engineを取得
+        """
+        # asyncio関連の依存ライブラリ(greenlet)は非同期版の使用時のみ必要なため、ここで読込
+        from sqlalchemy.ext.asyncio import create_async_engine
+        engine_txt = f'postgresql+asyncpg://{username}:{password}@{host}:{port}/{database}'
+        return create_async_engine(engine_txt, **self._engine_options)
+
+    async def create_table_from_declarative_base(self, base_class):
+        """
+        SQLAlcemyの`declarative_base()`で生成したメタクラスからテーブル作成(`PandaAlchemy`と同様)
+        """
+        async with self.engine.begin() as conn:
+            existence = {table_name: await conn.run_sync(
+                             lambda c: sqlalchemy.inspect(c).has_table(table_data.name, schema=table_data.schema))
+                         for table_name, table_data in base_class.metadata.tables.items()}
+            await conn.run_sync(base_class.metadata.create_all)
+        for table_name in base_class.metadata.tables:
+            if existence[table_name]:
+                print(f'Table `{table_name}` already exists')
+            else:
+                print(f'Table `{table_name}` has been made')
+
+    async def create_table_from_dtype_dict(self, table_name, dtype_dict, autoincrement=True, autoincrement_name='id'):
+        """
+        型定義dictからテーブル作成(`PandaAlchemy`と同様)
+        """
+        metadata = self._make_dtype_table(table_name, dtype_dict, autoincrement, autoincrement_name)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+        print(f'Table `{table_name}` has been made')
+
+    @staticmethod
+    def _align_datetime_timezones(df, column_types, session_timezone):
+        """
+        日時の列を、テキスト形式の`COPY`や`to_sql`と同じ値で転送されるよう変換
+
+        timestamptzの列のタイムゾーンなしの日時はセッションのタイムゾーンの時刻とみなし、
+        timestampの列のタイムゾーン付きの日時は現地時刻のままタイムゾーンを除く
+        """
+        df = df.copy()
+        for c in df.columns:
+            column_type = column_types.get(str(c))
+            if not isinstance(column_type, sqlalchemy.types.DateTime) or not df[c].notna().any():
+                continue
+            values = pd.to_datetime(df[c])
+            if column_type.timezone and values.dt.tz is None:
+                try:
+                    df[c] = values.dt.tz_localize(session_timezone)
+                except Exception as e:
+                    raise Exception(f'Column `{c}` has datetimes without time zone for timestamptz, and they cannot be '
+                                    f'localized to the session time zone {session_timezone} ({e}). '
+                                    'Localize them before inserting.')
+            elif not column_type.timezone and values.dt.tz is not None:
+                df[c] = values.dt.tz_localize(None)
+        return df
+
+    async def _copy_records(self, conn, df, table_name, chunksize, column_types):
+        """
+        asyncpgの`copy_records_to_table`(バイナリ形式の`COPY`)でDataFrameをテーブルにデータ追加
+
+        `column_types`は転送先テーブルの列名と型(`sqlalchemy.types`のメンバ)の組み合わせのdict
+        """
+        raw_conn = await conn.get_raw_connection()
+        driver_conn = raw_conn.driver_connection
+        # asyncpgはtimestamptzの列にタイムゾーンなしの日時を転送できないため、セッションのタイムゾーンで変換
+        session_timezone = await driver_conn.fetchval('SHOW TimeZone')
+        df = self._align_datetime_timezones(df, column_types, session_timezone)
+        columns = [str(c) for c in df.columns]
+        if chunksize is None:
+            chunksize = self.COPY_CHUNKSIZE
+        # 全チャンクを1トランザクションで転送
+        async with driver_conn.transaction():
+            for start in range(0, len(df), chunksize):
+                # asyncpgが変換できるようPythonの値に変換(欠損値はNone)
+                chunk = df.iloc[start:start + chunksize].astype(object)
+                chunk = chunk.where(chunk.notna(), None)
+                await driver_conn.copy_records_to_table(table_name, records=chunk.itertuples(index=False, name=None),
+                                                        columns=columns)
+
+    async def insert_from_df(self, df, table_name, dtype_dict=None, method='copy', chunksize=None):
+        """
+        pandas.DataFrameからDBのテーブルにデータ追加
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            追加対象のDataFrame
+
+        table_name : str
+            データを追加したいテーブル名(存在しない場合は`to_sql`と同様に作成)
+
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`PandaAlchemy.insert_from_df`と同様)
+
+        method : {None, "copy"}, default="copy"
+            データ追加方法
+
+            None: `pandas.DataFrame.to_sql`で1行ずつINSERT
+
+            "copy": asyncpgの`copy_records_to_table`でバイナリ形式の`COPY`により一括転送
+
+        chunksize : int, default=None
+            1回の送信で扱う行数(Noneなら`to_sql`は全行一括、"copy"は`COPY_CHUNKSIZE`行ずつ)
+        """
+        start_time = time.perf_counter()
+        # 型指定あるとき、DataFrameを変換 & SQLAlchemyの型形式を作成
+        df_convert, sqlalchemy_dtype = self._convert_types(df, dtype_dict)
+        if method is None:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(lambda c: df_convert.to_sql(table_name, c, if_exists='append', index=False,
+                                                                dtype=sqlalchemy_dtype, chunksize=chunksize))
+        elif method == 'copy':
+            async with self.engine.connect() as conn:
+                # テーブルが存在しないとき、DataFrameの列に合わせた空のテーブルを作成
+                if not await conn.run_sync(lambda c: sqlalchemy.inspect(c).has_table(table_name)):
+                    await conn.run_sync(lambda c: df_convert.head(0).to_sql(table_name, c, if_exists='fail',
+                                                                            index=False, dtype=sqlalchemy_dtype))
+                column_types = {column['name']: column['type'] for column in
+                                await conn.run_sync(lambda c: sqlalchemy.inspect(c).get_columns(table_name))}
+                # SQLAlchemy側のトランザクションを終了し、`COPY`はasyncpgのトランザクションで実行
+                await conn.commit()
+                await self._copy_records(conn, df_convert, table_name, chunksize, column_types)
+        else:
+            raise Exception(f'`method` should be None or "copy", but {method} is specified.')
+
+        elapsed = time.perf_counter() - start_time
+        print(f'Add {len(df_convert)} records to table `{table_name}` ({len(df_convert) / max(elapsed, 1e-9):.0f} records/s)')
+
+    async def truncate_table(self, table_name):
+        """
+        テーブルを空にする
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(sqlalchemy.text(f"TRUNCATE TABLE {table_name}"))
+        print(f'Table `{table_name}` is truncated')
+
+    async def drop_table(self, table_name):
+        """
+        テーブルを削除する
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(sqlalchemy.text(f"DROP TABLE {table_name}"))
+        print(f'Table `{table_name}` is dropped')
+
+    async def get_table_dict(self):
+        """
+        テーブル一覧をdict形式で取得
+        """
+        metadata = MetaData()
+        async with self.engine.connect() as conn:
+            await conn.run_sync(metadata.reflect)
+        return metadata.tables
+
+    async def check_table_existence(self, table_name):
+        """
+        テーブルの存在有無を確認
+        """
+        async with self.engine.connect() as conn:
+            return await conn.run_sync(lambda c: sqlalchemy.inspect(c).has_table(table_name))
+
+    def _to_statement(self, sql):
+        """
+        生SQLの文字列を`sqlalchemy.text`に変換(プレースホルダは`:name`形式)
+        """
+        return sqlalchemy.text(sql) if isinstance(sql, str) else sql
+
+    async def read_sql_query(self, sql, index_col=None, params=None, parse_dates=None, dtype_dict=None):
+        """
+        SQLクエリで取得した内容をpandas.DataFrameに出力
+
+        `pandas.read_sql_query`をコネクションプールのコネクション上で実行し、待ち時間中は他のコルーチンを実行する
+
+        Parameters
+        ----------
+        sql : str
+            適用するSQL文(生SQLのプレースホルダは`:name`形式)、またはSQL Expression Language構文
+
+        index_col, params, parse_dates, dtype_dict :
+            `PandaAlchemy.read_sql_query`と同様
+        """
+        if dtype_dict is not None:
+            dtype_except_dt, parse_dates = self._make_pandas_dtype(dtype_dict)
+        else:
+            dtype_except_dt = None
+        statement = self._to_statement(sql)
+        async with self.engine.connect() as conn:
+            return await conn.run_sync(lambda c: pd.read_sql_query(sql=statement, con=c, index_col=index_col,
+                                                                   params=params, parse_dates=parse_dates,
+                                                                   dtype=dtype_except_dt))
+
+    async def read_sql_query_chunks(self, sql, chunksize, index_col=None, params=None, parse_dates=None,
+                                    dtype_dict=None):
+        """
+        サーバサイドカーソルでSQLクエリの結果を逐次取得し、chunksize行ごとにDataFrameを返す非同期イテレータ
+
+        記載例:
+
+        >>> async for df in pdalchemy.read_sql_query_chunks(sql, chunksize=100000):
+        >>>     ...
+
+        Parameters
+        ----------
+        chunksize : int
+            1つのDataFrameの行数(クライアント側には最大chunksize行分のデータのみ保持される)
+
+        sql, index_col, params, parse_dates, dtype_dict :
+            `read_sql_query`と同様
+        """
+        if dtype_dict is not None:
+            dtype_except_dt, parse_dates = self._make_pandas_dtype(dtype_dict)
+        else:
+            dtype_except_dt = None
+        statement = self._to_statement(sql)
+        async with self.engine.connect() as conn:
+            result = await conn.stream(statement, params)
+            columns = list(result.keys())
+            async for rows in result.partitions(chunksize):
+                yield self._make_chunk_df(rows, columns, index_col, parse_dates, dtype_except_dt)
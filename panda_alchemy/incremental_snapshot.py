@@ -0,0 +1,180 @@
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+
+def _encode_value(value):
+    """
+    ウォーターマークの値をJSONに保存できる形式に変換
+    """
+    if value is None:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.datetime, np.datetime64)):
+        return {'type': 'datetime', 'value': pd.Timestamp(value).isoformat()}
+    if isinstance(value, datetime.date):
+        return {'type': 'date', 'value': value.isoformat()}
+    if isinstance(value, np.generic):
+        value = value.item()
+    return {'type': 'number', 'value': value}
+
+
+def _decode_value(encoded):
+    """
+    JSONに保存したウォーターマークの値を元の形式に戻す
+    """
+    if encoded is None:
+        return None
+    if encoded['type'] == 'datetime':
+        return pd.Timestamp(encoded['value'])
+    if encoded['type'] == 'date':
+        return datetime.date.fromisoformat(encoded['value'])
+    return encoded['value']
+
+
+class IncrementalSnapshot():
+    def __init__(self, snapshot_dir, max_parts=32):
+        """
+        `PandaAlchemy.sync_query`で差分取得したテーブル(クエリ)の内容を、Parquetファイルとしてローカルディスクに蓄積するスナップショット
+
+        1つのスナップショットで1つのテーブル(クエリ)を扱う。取得済のウォーターマーク(列の最大値)と差分ファイルの一覧は`state.json`に保存する(pyarrowが必要)
+
+        Parameters
+        ----------
+        snapshot_dir : str
+            スナップショットを保存するディレクトリ(存在しない場合は作成)
+
+        max_parts : int, default=32
+            差分ファイル数の上限(超えたら1ファイルにまとめ直す)
+        """
+        self.snapshot_dir = snapshot_dir
+        self.max_parts = max_parts
+        self._lock = threading.Lock()
+        self._state_path = os.path.join(snapshot_dir, 'state.json')
+        self._frame = None  # 読込済の内容(2回目以降はファイルを読み込まない)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        # 保存済の状態を読込
+        if os.path.exists(self._state_path):
+            with open(self._state_path) as f:
+                self._state = json.load(f)
+        else:
+            self._state = self._empty_state()
+
+    def _empty_state(self):
+        return {'source': None, 'watermark_column': None, 'watermark': None, 'parts': [], 'rows': 0, 'updated': None}
+
+    def _save_state(self):
+        """
+        状態をファイルに保存(書込途中のファイルを読まれないよう一時ファイルから置換)
+        """
+        tmp_path = f'{self._state_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self._state_path)
+
+    def _write_part(self, df):
+        """
+        DataFrameを差分ファイルとして保存し、ファイル名を返す
+        """
+        file_name = f'part-{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}.parquet'
+        df.to_parquet(os.path.join(self.snapshot_dir, file_name), index=False)
+        return file_name
+
+    @property
+    def watermark(self):
+        """
+        取得済のウォーターマーク(Noneなら未取得)
+        """
+        return _decode_value(self._state['watermark'])
+
+    @property
+    def state(self):
+        """
+        スナップショットの状態("source": 取得元のSQL, "watermark_column": ウォーターマークの列名, "watermark": 取得済の最大値,
+        "parts": 差分ファイルの一覧, "rows": 行数, "updated": 最終更新時刻(UNIX時間))
+        """
+        return dict(self._state, watermark=self.watermark, parts=list(self._state['parts']))
+
+    def check_source(self, source, watermark_column):
+        """
+        スナップショットの取得元が変わっていないか確認(初回は取得元を記録)
+        """
+        if self._state['source'] is None:
+            self._state['source'] = source
+            self._state['watermark_column'] = watermark_column
+        elif self._state['source'] != source or self._state['watermark_column'] != watermark_column:
+            raise Exception(f'Snapshot `{self.snapshot_dir}` was created from a different query or watermark column. '
+                            'Use another directory or call `reset()` first.')
+
+    def load(self, key_columns=None):
+        """
+        スナップショットの内容をDataFrameで取得(`key_columns`指定時は、キーが重複する行は後から追加したものを残す)
+        """
+        with self._lock:
+            if self._frame is None:
+                dfs = [pd.read_parquet(os.path.join(self.snapshot_dir, part)) for part in self._state['parts']]
+                self._frame = self._combine(dfs, key_columns)
+            return self._frame
+
+    def _combine(self, dfs, key_columns):
+        """
+        複数のDataFrameを結合(`key_columns`指定時は、キーが重複する行は後のものを残す)
+        """
+        dfs = [df for df in dfs if len(df) > 0] or dfs[:1]
+        if len(dfs) == 0:
+            return pd.DataFrame()
+        df = pd.concat(dfs, ignore_index=True) if len(dfs) > 1 else dfs[0]
+        if key_columns is not None:
+            df = df.drop_duplicates(subset=key_columns, keep='last', ignore_index=True)
+        return df
+
+    def append(self, delta, watermark, key_columns=None):
+        """
+        差分のDataFrameを追加し、ウォーターマークを更新して、追加後の内容を返す
+
+        Parameters
+        ----------
+        delta : pandas.DataFrame
+            追加する差分
+
+        watermark : int, float or datetime
+            差分取得後のウォーターマーク
+
+        key_columns : list[str], default=None
+            行の一致判定に使用する列名(指定時は、キーが既存の行と一致した行で置き換える)
+        """
+        current = self.load(key_columns)
+        with self._lock:
+            if len(delta) > 0:
+                self._state['parts'].append(self._write_part(delta))
+                current = self._combine([current, delta], key_columns)
+            old_parts = []
+            # 差分ファイルが多くなったら、1ファイルにまとめ直す
+            if len(self._state['parts']) > self.max_parts:
+                old_parts = self._state['parts']
+                self._state['parts'] = [self._write_part(current)]
+            self._state['watermark'] = _encode_value(watermark)
+            self._state['rows'] = len(current)
+            self._state['updated'] = time.time()
+            self._save_state()
+            for part in old_parts:
+                os.remove(os.path.join(self.snapshot_dir, part))
+            self._frame = current
+            return current
+
+    def reset(self):
+        """
+        スナップショットを破棄(次回の`PandaAlchemy.sync_query`で全件取得し直す)
+        """
+        with self._lock:
+            for part in self._state['parts']:
+                path = os.path.join(self.snapshot_dir, part)
+                if os.path.exists(path):
+                    os.remove(path)
+            self._state = self._empty_state()
+            self._frame = None
+            self._save_state()
@@ -0,0 +1,417 @@
+import sqlalchemy
+from sqlalchemy import func, distinct, select
+from sqlalchemy import Float, Numeric, Integer, BigInteger, Boolean, String, DateTime
+
+# 集計関数名(pandasの`agg`で使用する名称)とSQLの集計関数の組み合わせ
+_AGG_FUNCS = {
+    'sum': func.sum,
+    'mean': func.avg,
+    'min': func.min,
+    'max': func.max,
+    'count': func.count,
+    'nunique': lambda column: func.count(distinct(column)),
+    'std': func.stddev_samp,
+    'var': func.var_samp,
+    'median': lambda column: func.percentile_cont(0.5).within_group(column),
+}
+
+
+def _dtype_from_type(sqlalchemy_type, nullable=True):
+    """
+    列の型(`sqlalchemy.types`のメンバ)から`read_sql_query`に渡すdtype_dictの値を決定(対応する値がなければNone)
+
+    NULLを含み得る整数型は欠損値を保持できる"BigInteger"(pandasのInt64型)とし、NULLを含み得る真偽値型は変換しない
+    """
+    if isinstance(sqlalchemy_type, (Float, Numeric)):
+        return 'Float'
+    elif isinstance(sqlalchemy_type, Integer):
+        if nullable:
+            return 'BigInteger'
+        return 'BigInteger' if isinstance(sqlalchemy_type, BigInteger) else 'Integer'
+    elif isinstance(sqlalchemy_type, Boolean):
+        return None if nullable else 'Boolean'
+    elif isinstance(sqlalchemy_type, String):
+        return 'String'
+    elif isinstance(sqlalchemy_type, DateTime):
+        return 'DateTime'
+    return None
+
+
+def _agg_dtype(func_name, dtype):
+    """
+    集計結果の列のdtype_dictの値を決定(集計前の列の値は`dtype`)
+    """
+    if func_name in ('count', 'nunique', 'size'):
+        return 'BigInteger'
+    elif func_name in ('mean', 'std', 'var', 'median'):
+        return 'Float'
+    elif func_name == 'sum':
+        return 'BigInteger' if dtype in ('Integer', 'BigInteger') else dtype
+    # min, maxはグループ内が全てNULLの場合NULLとなるため、NULLを含み得る型とする
+    return 'BigInteger' if dtype == 'Integer' else (None if dtype == 'Boolean' else dtype)
+
+
+class LazyColumn():
+    def __init__(self, expression):
+        """
+        `LazyFrame`の列、または列に対する条件式(`sqlalchemy`の式)
+
+        比較演算子(`==`, `>`等)、論理演算子(`&`, `|`, `~`)と`isin`, `isna`, `notna`, `between`で条件式を作成し、
+        `LazyFrame`のフィルタに使用する
+        """
+        self.expression = expression
+
+    def _wrap(self, other):
+        return other.expression if isinstance(other, LazyColumn) else other
+
+    def __eq__(self, other):
+        return LazyColumn(self.expression == self._wrap(other))
+
+    def __ne__(self, other):
+        return LazyColumn(self.expression != self._wrap(other))
+
+    def __lt__(self, other):
+        return LazyColumn(self.expression < self._wrap(other))
+
+    def __le__(self, other):
+        return LazyColumn(self.expression <= self._wrap(other))
+
+    def __gt__(self, other):
+        return LazyColumn(self.expression > self._wrap(other))
+
+    def __ge__(self, other):
+        return LazyColumn(self.expression >= self._wrap(other))
+
+    def __and__(self, other):
+        return LazyColumn(sqlalchemy.and_(self.expression, self._wrap(other)))
+
+    def __or__(self, other):
+        return LazyColumn(sqlalchemy.or_(self.expression, self._wrap(other)))
+
+    def __invert__(self):
+        return LazyColumn(sqlalchemy.not_(self.expression))
+
+    def isin(self, values):
+        """ 値が`values`のいずれかに一致 """
+        return LazyColumn(self.expression.in_(list(values)))
+
+    def isna(self):
+        """ 値がNULL """
+        return LazyColumn(self.expression.is_(None))
+
+    def notna(self):
+        """ 値がNULLでない """
+        return LazyColumn(self.expression.is_not(None))
+
+    def between(self, left, right):
+        """ 値が`left`以上`right`以下 """
+        return LazyColumn(self.expression.between(left, right))
+
+    __hash__ = None
+
+
+class LazyGroupBy():
+    def __init__(self, frame, by, columns=None, as_index=True, sort=True):
+        """
+        `LazyFrame.groupby`の結果(集計方法を指定すると`GROUP BY`句を含む`LazyFrame`を返す)
+        """
+        self._frame = frame
+        self._by = by
+        self._columns = columns
+        self._as_index = as_index
+        self._sort = sort
+
+    def __getitem__(self, key):
+        columns = [key] if isinstance(key, str) else list(key)
+        return LazyGroupBy(self._frame, self._by, columns=columns, as_index=self._as_index, sort=self._sort)
+
+    def agg(self, func_or_dict=None, **named_aggs):
+        """
+        集計方法を指定して集計(`pandas.core.groupby.DataFrameGroupBy.agg`と同様)
+
+        集計関数は"sum", "mean", "min", "max", "count", "nunique", "std", "var", "median"から選択
+
+        記載例:
+
+        >>> pdalchemy.table('iris').groupby('species').agg({'sepal_length': 'mean', 'sepal_width': ['min', 'max']})
+        >>> pdalchemy.table('iris').groupby('species').agg(n=('sepal_length', 'count'), avg=('sepal_length', 'mean'))
+
+        Parameters
+        ----------
+        func_or_dict : str or dict[str, str or list[str]], default=None
+            集計関数名(グループ化に使用しない全列に適用)、または列名と集計関数名の組み合わせのdict
+
+            1つの列に複数の集計関数を指定した場合、結果の列名は"列名_集計関数名"とする
+
+        **named_aggs
+            結果の列名と(列名, 集計関数名)の組み合わせ
+        """
+        if func_or_dict is None and not named_aggs:
+            raise Exception('Specify aggregation functions as `func_or_dict` or keyword arguments.')
+        columns = self._columns or [c for c in self._frame.columns if c not in self._by]
+        # (結果の列名, 列名, 集計関数名)のリストを作成
+        specs = []
+        if isinstance(func_or_dict, str):
+            specs += [(c, c, func_or_dict) for c in columns]
+        elif isinstance(func_or_dict, dict):
+            for column, func_names in func_or_dict.items():
+                if isinstance(func_names, str):
+                    specs.append((column, column, func_names))
+                else:
+                    specs += [(f'{column}_{f}', column, f) for f in func_names]
+        elif func_or_dict is not None:
+            raise Exception(f'`func_or_dict` should be a string or dict, but {func_or_dict} is specified.')
+        specs += [(name, column, f) for name, (column, f) in named_aggs.items()]
+        return self._frame._aggregate(self._by, specs, self._as_index, self._sort)
+
+    def _agg_all(self, func_name):
+        """
+        グループ化に使用しない全列に集計関数を適用(数値の集計関数は数値型の列のみ。`numeric_only=True`と同様)
+        """
+        columns = self._columns or [c for c in self._frame.columns if c not in self._by]
+        if func_name in ('sum', 'mean', 'std', 'var', 'median'):
+            dtype_dict = self._frame._dtype_dict
+            columns = [c for c in columns if dtype_dict.get(c) in ('Float', 'Integer', 'BigInteger')]
+        return self.agg({c: func_name for c in columns})
+
+    def sum(self):
+        """ グループごとの合計 """
+        return self._agg_all('sum')
+
+    def mean(self):
+        """ グループごとの平均 """
+        return self._agg_all('mean')
+
+    def min(self):
+        """ グループごとの最小値 """
+        return self._agg_all('min')
+
+    def max(self):
+        """ グループごとの最大値 """
+        return self._agg_all('max')
+
+    def count(self):
+        """ グループごとのNULLでない値の数 """
+        return self._agg_all('count')
+
+    def size(self):
+        """ グループごとの行数(結果の列名は"size") """
+        return self._frame._aggregate(self._by, [('size', None, 'size')], self._as_index, self._sort)
+
+
+class LazyFrame():
+    def __init__(self, pdalchemy, statement, dtype_dict, index_col=None):
+        """
+        SQLAlchemyのSELECT文を組み立て、`collect()`(または`to_pandas()`)の呼出時にのみクエリを実行するDataFrame風のクラス
+
+        列の選択、フィルタ、`groupby().agg`、`head`、`sort_values`をSQLとしてDB側で処理するため、
+        必要な結果のみを転送できる。`PandaAlchemy.table()`で作成する
+
+        記載例:
+
+        >>> iris = pdalchemy.table('iris')
+        >>> df = iris[iris['sepal_length'] > 5.0][['species', 'petal_width']].groupby('species').mean().collect()
+
+        Parameters
+        ----------
+        pdalchemy : panda_alchemy.PandaAlchemy
+            クエリの実行に使用するインスタンス
+
+        statement : sqlalchemy.sql.Select
+            SELECT文
+
+        dtype_dict : dict[str, str]
+            結果の列名とdtype_dictの値の組み合わせ(`read_sql_query`に渡す)
+
+        index_col : list[str], default=None
+            結果のインデックスとする列名
+        """
+        self._pdalchemy = pdalchemy
+        self._statement = statement
+        self._dtype_dict = dtype_dict
+        self._index_col = index_col
+        self._base = None  # 続く処理の対象となるSELECT文(`_base_statement`の結果)
+
+    def _new(self, statement, dtype_dict=None, index_col=None):
+        return LazyFrame(self._pdalchemy, statement, self._dtype_dict if dtype_dict is None else dtype_dict,
+                         index_col=index_col)
+
+    def _is_grouped_or_limited(self):
+        """ `GROUP BY`または`LIMIT`を含むか(含む場合、続く処理はサブクエリに対して行う) """
+        return self._statement._group_by_clauses or self._statement._limit_clause is not None
+
+    def _as_subquery(self):
+        """ SELECT文をサブクエリとし、その全列を選択するSELECT文を返す """
+        subquery = self._statement.subquery('_pdalchemy_lazy')
+        return select(*subquery.c)
+
+    def _base_statement(self):
+        """
+        続く処理の対象となるSELECT文(`GROUP BY`または`LIMIT`を含む場合はサブクエリ化)
+
+        `frame["列名"]`で取得した列を条件式に使用できるよう、同じサブクエリを再利用する
+        """
+        if self._base is None:
+            self._base = self._as_subquery() if self._is_grouped_or_limited() else self._statement
+        return self._base
+
+    def _column(self, statement, name):
+        try:
+            return statement.selected_columns[name]
+        except KeyError:
+            raise Exception(f'Column `{name}` does not exist. Available columns are {self.columns}.') from None
+
+    @property
+    def columns(self):
+        """ 結果の列名のリスト(インデックスとする列を除く) """
+        return [c for c in self._statement.selected_columns.keys() if c not in (self._index_col or [])]
+
+    @property
+    def sql(self):
+        """ 実行されるSQL文(値を埋め込んだ文字列。確認用) """
+        return str(self._statement.compile(dialect=self._pdalchemy.engine.dialect,
+                                           compile_kwargs={'literal_binds': True}))
+
+    def __repr__(self):
+        return f'LazyFrame(columns={self.columns})\n{self.sql}'
+
+    def __getattr__(self, name):
+        # 列名での属性アクセス(`iris.species`等)
+        if name.startswith('_') or name not in self.columns:
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, key):
+        """
+        `frame["列名"]`: 列(`LazyColumn`)を返す
+
+        `frame[["列名1", "列名2"]]`: 列を選択した`LazyFrame`を返す
+
+        `frame[条件式]`: 条件に一致する行のみの`LazyFrame`を返す
+        """
+        if isinstance(key, str):
+            return LazyColumn(self._column(self._base_statement(), key))
+        elif isinstance(key, LazyColumn):
+            return self._filter(key)
+        elif isinstance(key, (list, tuple)):
+            return self._select_columns(list(key))
+        raise Exception(f'Key should be a column name, list of column names or condition, but {key} is specified.')
+
+    def _filter(self, condition):
+        """
+        条件に一致する行を抽出(`WHERE`句)
+        """
+        if self._is_grouped_or_limited():
+            # 条件式にサブクエリ化前の列が含まれる場合、サブクエリの列に置き換える
+            statement = self._base_statement()
+            subquery = statement.get_final_froms()[0]
+            expression = sqlalchemy.sql.util.ClauseAdapter(subquery).traverse(condition.expression)
+            return self._new(statement.where(expression), index_col=self._index_col)
+        return self._new(self._statement.where(condition.expression), index_col=self._index_col)
+
+    def _select_columns(self, names):
+        """
+        列を選択(`SELECT`句)
+        """
+        statement = self._base_statement()
+        # インデックスとする列は常に選択
+        names = [c for c in (self._index_col or []) if c not in names] + names
+        columns = [self._column(statement, name) for name in names]
+        dtype_dict = {name: self._dtype_dict[name] for name in names if name in self._dtype_dict}
+        return self._new(statement.with_only_columns(*columns), dtype_dict=dtype_dict, index_col=self._index_col)
+
+    def head(self, n=5):
+        """
+        先頭のn行を取得(`LIMIT`句)
+        """
+        limit = self._statement._limit_clause
+        if limit is not None:
+            # 既に`LIMIT`を含む場合は小さい方
+            return self._new(self._statement.limit(min(n, limit.value)), index_col=self._index_col)
+        return self._new(self._statement.limit(n), index_col=self._index_col)
+
+    def sort_values(self, by, ascending=True):
+        """
+        行を並べ替え(`ORDER BY`句)
+
+        Parameters
+        ----------
+        by : str or list[str]
+            並べ替えに使用する列名
+
+        ascending : bool or list[bool], default=True
+            Trueなら昇順、Falseなら降順(列ごとに指定する場合はリスト)
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        ascending = [ascending] * len(by) if isinstance(ascending, bool) else list(ascending)
+        # `LIMIT`を含む場合は、抽出後の行を並べ替え
+        if self._statement._limit_clause is not None:
+            statement = self._base_statement()
+        else:
+            statement = self._statement.order_by(None)
+        order_by = [self._column(statement, name).asc() if asc else self._column(statement, name).desc()
+                    for name, asc in zip(by, ascending)]
+        return self._new(statement.order_by(*order_by), index_col=self._index_col)
+
+    def groupby(self, by, as_index=True, sort=True):
+        """
+        列の値でグループ化(`GROUP BY`句)。`agg`等で集計方法を指定する
+
+        Parameters
+        ----------
+        by : str or list[str]
+            グループ化に使用する列名
+
+        as_index : bool, default=True
+            Trueなら、グループ化に使用した列を結果のインデックスとする
+
+        sort : bool, default=True
+            Trueなら、グループ化に使用した列で結果を並べ替える
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        return LazyGroupBy(self, by, as_index=as_index, sort=sort)
+
+    def _aggregate(self, by, specs, as_index, sort):
+        """
+        グループごとに集計するSELECT文を作成
+
+        `specs`は(結果の列名, 列名, 集計関数名)のリスト
+        """
+        statement = self._base_statement()
+        keys = [self._column(statement, name) for name in by]
+        columns = list(keys)
+        dtype_dict = {name: self._dtype_dict[name] for name in by if name in self._dtype_dict}
+        for name, column_name, func_name in specs:
+            if func_name == 'size':
+                columns.append(func.count().label(name))
+            elif func_name in _AGG_FUNCS:
+                columns.append(_AGG_FUNCS[func_name](self._column(statement, column_name)).label(name))
+            else:
+                raise Exception(f'Aggregation function should be one of {list(_AGG_FUNCS)}, but {func_name} is specified.')
+            dtype = _agg_dtype(func_name, self._dtype_dict.get(column_name))
+            if dtype is not None:
+                dtype_dict[name] = dtype
+        statement = statement.with_only_columns(*columns).group_by(*keys).order_by(None)
+        if sort:
+            statement = statement.order_by(*keys)
+        return self._new(statement, dtype_dict=dtype_dict, index_col=by if as_index else None)
+
+    def collect(self, **kwargs):
+        """
+        クエリを実行し、結果をpandas.DataFrameで取得
+
+        列の型は、テーブルの列の型から決定したdtype_dictで`PandaAlchemy.read_sql_query`により変換する
+
+        Parameters
+        ----------
+        **kwargs
+            `PandaAlchemy.read_sql_query`に渡す引数(`method`等)
+        """
+        return self._pdalchemy.read_sql_query(self._statement, index_col=self._index_col,
+                                              dtype_dict=self._dtype_dict or None, **kwargs)
+
+    def to_pandas(self, **kwargs):
+        """
+        クエリを実行し、結果をpandas.DataFrameで取得(`collect`と同様)
+        """
+        return self.collect(**kwargs)
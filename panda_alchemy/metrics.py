@@ -0,0 +1,339 @@
+import functools
+import inspect
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# 1操作ごとに記録する数値項目
+METRIC_FIELDS = ('wall_time', 'conversion_time', 'db_time', 'pool_wait_time', 'rows', 'bytes', 'queries')
+
+# 計測中の操作の記録(スレッドごと。SQLAlchemyのイベントから参照するため、全ての`Instrumentation`で共通)
+_local = threading.local()
+# 記録への加算時のロック
+_record_lock = threading.Lock()
+# engineごとのイベントの登録数(同じengineを共有する複数の`Instrumentation`でもイベントは1つだけ登録)
+_listener_counts = weakref.WeakKeyDictionary()
+_listener_lock = threading.Lock()
+
+
+def _current_record():
+    """
+    現在のスレッドで計測中の操作の記録(計測中でなければNone)
+    """
+    return getattr(_local, 'record', None)
+
+
+def _add_to_record(field, value, record=None):
+    """
+    計測中の操作の`field`項目に値を加算(計測中でなければ何もしない)
+    """
+    if record is None:
+        record = _current_record()
+        if record is None:
+            return
+    with _record_lock:
+        record[field] += value
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_pdalchemy_query_start', []).append(time.perf_counter())
+    # 実行に失敗した場合に開始時刻を破棄できるよう、実行中であることを記録
+    if context is not None:
+        context._pdalchemy_query_running = True
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._pdalchemy_query_running = False
+    starts = conn.info.get('_pdalchemy_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    # SQLを実行したスレッドで計測中の操作に加算
+    record = _current_record()
+    if record is not None:
+        _add_to_record('db_time', elapsed, record)
+        _add_to_record('queries', 1, record)
+
+
+def _handle_error(exception_context):
+    # 実行に失敗したSQLの開始時刻を破棄(残すと同じコネクションの次のSQLの実行時間がずれる)
+    context = exception_context.execution_context
+    if not getattr(context, '_pdalchemy_query_running', False):
+        return
+    context._pdalchemy_query_running = False
+    starts = exception_context.connection.info.get('_pdalchemy_query_start')
+    if starts:
+        starts.pop()
+
+
+def _listen_engine(engine):
+    """
+    engineにSQLの実行時間を計測するイベントを登録(登録済なら登録数のみ加算)
+    """
+    with _listener_lock:
+        count = _listener_counts.get(engine, 0)
+        if count == 0:
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+        _listener_counts[engine] = count + 1
+
+
+def _unlisten_engine(engine):
+    """
+    engineのイベントの登録数を減算し、0になったらイベントを解除
+    """
+    with _listener_lock:
+        count = _listener_counts.get(engine, 0) - 1
+        if count > 0:
+            _listener_counts[engine] = count
+            return
+        _listener_counts.pop(engine, None)
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.remove(engine, 'handle_error', _handle_error)
+
+
+def instrumented(method):
+    """
+    `PandaAlchemy`のメソッドを1操作として計測するデコレータ
+
+    コールバック未登録時は計測を行わず、そのままメソッドを実行する
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.metrics.callbacks:
+            return method(self, *args, **kwargs)
+        table_name = signature.bind(self, *args, **kwargs).arguments.get('table_name')
+        with self.metrics.operation(method.__name__, table_name):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class Instrumentation():
+    def __init__(self, engine):
+        """
+        `PandaAlchemy`の各操作の処理時間やデータ量を計測し、登録したコールバックに渡すクラス
+
+        操作ごとに以下の項目を記録したdictをコールバックに渡す
+
+        "operation": メソッド名, "table": テーブル名(指定がある場合), "start": 開始時刻(UNIX時間), "error": 例外(成功時はNone),
+        "wall_time": 処理時間(秒), "conversion_time": 型変換の時間(秒), "db_time": DBでの処理時間(秒),
+        "pool_wait_time": コネクション取得の待ち時間(秒), "rows": 行数, "bytes": `COPY`で転送したバイト数, "queries": 実行したSQL数
+
+        コールバック未登録時は計測を行わない(SQLAlchemyのイベントも登録しない)ため、オーバーヘッドはほぼ発生しない。
+        SQLAlchemyのイベントはengineごとに1つだけ登録し、SQLを実行したスレッドで計測中の操作に加算する
+
+        Parameters
+        ----------
+        engine : sqlalchemy.engine.Engine
+            計測対象のengine
+        """
+        self.engine = engine
+        self.callbacks = []
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback):
+        """
+        計測結果を受け取るコールバックを登録(初回登録時に、engineにSQLAlchemyのイベントが未登録なら登録)
+
+        Parameters
+        ----------
+        callback : callable
+            1操作の計測結果(dict)を引数に取る関数(`InMemoryCollector`, `PrometheusExporter`等)
+        """
+        with self._lock:
+            if not self.callbacks:
+                _listen_engine(self.engine)
+            self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        """
+        コールバックの登録を解除(全て解除し、engineを計測する他のインスタンスもなければSQLAlchemyのイベントも解除)
+        """
+        with self._lock:
+            self.callbacks.remove(callback)
+            if not self.callbacks:
+                _unlisten_engine(self.engine)
+
+    def close(self):
+        """
+        全てのコールバックの登録を解除(共有engineを使用するインスタンスの終了時に、イベントを残さないよう使用)
+        """
+        for callback in list(self.callbacks):
+            self.remove_callback(callback)
+
+    @property
+    def current(self):
+        """
+        現在のスレッドで計測中の操作の記録(計測中でなければNone)
+        """
+        return _current_record()
+
+    @contextmanager
+    def operation(self, name, table_name=None):
+        """
+        withブロック内を1操作として計測し、終了時にコールバックに計測結果を渡す
+
+        計測中の操作の中で呼び出された操作(`sync_query`内の`read_sql_query`等)は別の操作として記録せず、呼出元の操作に加算する
+        """
+        if not self.callbacks:
+            yield None
+            return
+        if self.current is not None:
+            yield self.current
+            return
+        record = {'operation': name, 'table': table_name, 'start': time.time(), 'error': None}
+        record.update({k: 0 for k in METRIC_FIELDS})
+        parent = self.current
+        _local.record = record
+        start_time = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = e
+            raise
+        finally:
+            record['wall_time'] = time.perf_counter() - start_time
+            _local.record = parent
+            for callback in list(self.callbacks):
+                callback(record)
+
+    @contextmanager
+    def attach(self, record):
+        """
+        別スレッドで実行する処理の計測値を、呼出元スレッドの操作の記録に加算する
+        """
+        if record is None:
+            yield
+            return
+        previous = self.current
+        _local.record = record
+        try:
+            yield
+        finally:
+            _local.record = previous
+
+    @contextmanager
+    def phase(self, field):
+        """
+        withブロック内の処理時間を、計測中の操作の`field`項目に加算
+        """
+        record = self.current
+        if record is None:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(field, time.perf_counter() - start_time, record)
+
+    def add(self, field, value, record=None):
+        """
+        計測中の操作の`field`項目に値を加算(計測中でなければ何もしない)
+        """
+        _add_to_record(field, value, record)
+
+
+class InMemoryCollector():
+    def __init__(self, maxlen=10000):
+        """
+        計測結果をメモリ上に保持するコールバック
+
+        Parameters
+        ----------
+        maxlen : int, default=10000
+            保持する最大件数(超えたら古いものから破棄)
+        """
+        self.records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            self.records.append(dict(record))
+
+    def summary(self):
+        """
+        操作ごとに計測結果を集計したdictを取得(各項目の合計値と、操作回数"count", 失敗回数"errors")
+        """
+        summary = {}
+        with self._lock:
+            for record in self.records:
+                item = summary.setdefault(record['operation'], dict({k: 0 for k in METRIC_FIELDS}, count=0, errors=0))
+                item['count'] += 1
+                item['errors'] += record['error'] is not None
+                for k in METRIC_FIELDS:
+                    item[k] += record[k]
+        return summary
+
+    def clear(self):
+        """
+        保持している計測結果を破棄
+        """
+        with self._lock:
+            self.records.clear()
+
+
+class PrometheusExporter():
+    # 出力するメトリクス名、計測項目、説明
+    METRICS = (
+        ('panda_alchemy_operations_total', 'count', 'Number of PandaAlchemy operations'),
+        ('panda_alchemy_operation_errors_total', 'errors', 'Number of failed PandaAlchemy operations'),
+        ('panda_alchemy_operation_seconds_total', 'wall_time', 'Wall time spent in PandaAlchemy operations'),
+        ('panda_alchemy_conversion_seconds_total', 'conversion_time', 'Time spent in dtype conversion'),
+        ('panda_alchemy_db_seconds_total', 'db_time', 'Time spent waiting for the database'),
+        ('panda_alchemy_pool_wait_seconds_total', 'pool_wait_time', 'Time spent acquiring pooled connections'),
+        ('panda_alchemy_rows_total', 'rows', 'Rows read or written'),
+        ('panda_alchemy_bytes_total', 'bytes', 'Bytes transferred with COPY'),
+        ('panda_alchemy_queries_total', 'queries', 'SQL statements executed through SQLAlchemy'),
+    )
+
+    def __init__(self, const_labels=None):
+        """
+        計測結果を操作ごとに累積し、Prometheusのテキスト形式で出力するコールバック
+
+        Parameters
+        ----------
+        const_labels : dict[str, str], default=None
+            全てのメトリクスに付与するラベル(例: {"job": "etl"})
+        """
+        self.const_labels = const_labels or {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            item = self._totals.setdefault(record['operation'], dict({k: 0 for k in METRIC_FIELDS}, count=0, errors=0))
+            item['count'] += 1
+            item['errors'] += record['error'] is not None
+            for k in METRIC_FIELDS:
+                item[k] += record[k]
+
+    def dump(self):
+        """
+        累積した計測結果をPrometheusのテキスト形式(exposition format)の文字列で取得
+        """
+        lines = []
+        with self._lock:
+            for name, field, description in self.METRICS:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} counter')
+                for operation, item in sorted(self._totals.items()):
+                    labels = dict(self.const_labels, operation=operation)
+                    label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                    lines.append(f'{name}{{{label_text}}} {item[field]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Prometheusのテキスト形式でファイルに出力(node_exporterのtextfile collector等で使用)
+        """
+        with open(path, 'w') as f:
+            f.write(self.dump())
@@ -1,12 +1,98 @@
+import glob
+import io
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import pandas as pd
 import sqlalchemy
 from sqlalchemy import create_engine
 from sqlalchemy import Table, MetaData, Column
 from sqlalchemy import Float, Integer, BigInteger, Boolean, String, DateTime, Date
 
+from .postgres_copy import encode_binary_copy, parse_copy_datetime, _get_binary_format, _needs_session_timezone, \
+    POSTGRES_STRING_OIDS, POSTGRES_DATETIME_OIDS, POSTGRES_FLOAT_OIDS
+from .schema_catalog import SchemaCatalog
+from .result_cache import QueryResultCache, _extract_tables
+from .metrics import Instrumentation, instrumented
+from .engine_registry import get_shared_engine, _make_engine_options
+from .arrow_utils import _check_pyarrow, make_arrow_column_types, read_copy_csv, open_copy_csv, write_parquet_dataset, \
+    arrow_table_to_pandas, arrow_type_from_dtype, iter_file_batches, batch_to_copy_csv, pa
+from .lazy_frame import LazyFrame, _dtype_from_type
+
+logger = logging.getLogger(__name__)
+
+# `bulk_load`で削除するインデックス(制約に使用されていないインデックス)を取得するSQL
+_SECONDARY_INDEX_SQL = '''
+SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+FROM pg_index AS i
+WHERE i.indrelid = ANY(%s::regclass[])
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint AS c WHERE c.conindid = i.indexrelid)
+'''
+# `bulk_load`で削除する外部キー制約(対象テーブルから参照する制約、対象テーブルを参照する制約)を取得するSQL
+_FOREIGN_KEY_SQL = '''
+SELECT c.conrelid::regclass::text, quote_ident(c.conname), regexp_replace(pg_get_constraintdef(c.oid), ' NOT VALID$', ''),
+       c.convalidated
+FROM pg_constraint AS c
+WHERE c.contype = 'f' AND (c.conrelid = ANY(%s::regclass[]) OR c.confrelid = ANY(%s::regclass[]))
+'''
+
+
+class _CountingReader():
+    """
+    読み込んだバイト数を数えるファイルオブジェクトのラッパー
+    """
+    def __init__(self, source):
+        self.source = source
+        self.n_bytes = 0
+
+    @property
+    def closed(self):
+        return self.source.closed
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        self.n_bytes += len(data)
+        return data
+
+    def close(self):
+        self.source.close()
+
+
+def _read_partition(connection_args, sql, params, index_col, dtype_dict, method):
+    """
+    `PandaAlchemy.read_partitioned`のプロセス並列時に、子プロセスで1パーティション分を読込
+    """
+    with PandaAlchemy(*connection_args) as pdalchemy:
+        return pdalchemy.read_sql_query(sql, index_col=index_col, params=params,
+                                        dtype_dict=dtype_dict, method=method)
+
+
 class PandaAlchemy():
+    # `method="copy"`で1回の`COPY`に送る行数
+    COPY_CHUNKSIZE = 100000
+    # `read_sql_query(method="copy")`で受信データをメモリに保持する上限バイト数(超えたら一時ファイルに退避)
+    COPY_SPOOL_SIZE = 256 * 1024 * 1024
+    # `export_query`で1回にArrowへ変換するCSVのバイト数
+    EXPORT_BLOCK_SIZE = 16 * 1024 * 1024
+    # `import_file`で1回に読み込むCSVのバイト数
+    IMPORT_BLOCK_SIZE = 4 * 1024 * 1024
+    # `auto_dtypes=True`で文字列型の列をcategory型とする条件(値の種類数の推定値の上限、テーブルの行数に対する割合の上限)
+    AUTO_CATEGORY_MAX_DISTINCT = 1000
+    AUTO_CATEGORY_MAX_RATIO = 0.5
+
     # 初期化
-    def __init__(self, username, password, host, port, database):
+    def __init__(self, username, password, host, port, database, catalog_ttl=60, catalog_maxsize=128,
+                 result_cache=None, metrics_callbacks=None, shared_engine=False, pool_size=None,
+                 max_overflow=None, pool_pre_ping=None, pool_recycle=None, statement_timeout=None):
         """
         PandasとPostgreSQLのデータ入出力用クラス
 
@@ -28,29 +114,121 @@ class PandaAlchemy():
 
         database : str
             PostgreSQL DB名
+
+        catalog_ttl : float, default=60
+            テーブルの存在有無や列の型のキャッシュ有効期間(秒)。Noneなら無期限
+
+            本クラス経由でのテーブル作成・削除時は自動で破棄される
+
+        catalog_maxsize : int, default=128
+            テーブルの存在有無や列の型のキャッシュの最大件数
+
+        result_cache : panda_alchemy.QueryResultCache, default=None
+            `read_sql_query`の結果キャッシュ(Noneならキャッシュしない)
+
+            本クラス経由でデータを変更したテーブル(`insert_from_df`, `truncate_table`, `drop_table`等)を参照するキャッシュは自動で破棄される
+
+            記載例: 
+
+            >>> pdalchemy = PandaAlchemy(USERNAME, PASSWORD, HOST, PORT, DB_NAME, result_cache=QueryResultCache('./query_cache'))
+
+        metrics_callbacks : list[callable], default=None
+            各操作の計測結果(処理時間、行数等のdict)を受け取るコールバックのリスト。Noneなら計測しない
+
+            `self.metrics.add_callback()`で後から登録することも可能
+
+            記載例: 
+
+            >>> collector = InMemoryCollector()
+            >>> pdalchemy = PandaAlchemy(USERNAME, PASSWORD, HOST, PORT, DB_NAME, metrics_callbacks=[collector])
+            >>> print(collector.summary())
+
+        shared_engine : bool, default=False
+            Trueなら、接続先と下記のプール設定が同じengine(コネクションプール)をプロセス内の全インスタンスで共有する
+
+            リクエストごとにインスタンスを作成する場合等に、接続のたびのTCP接続や認証を省略できる。
+            共有engineはwithブロックを抜けても破棄されない(全て破棄する場合は`dispose_shared_engines()`を使用)
+
+        pool_size : int, default=None
+            コネクションプールで保持するコネクション数(NoneならSQLAlchemyのデフォルト値5)
+
+        max_overflow : int, default=None
+            `pool_size`を超えて一時的に作成できるコネクション数(NoneならSQLAlchemyのデフォルト値10)
+
+        pool_pre_ping : bool, default=None
+            Trueなら、プールから取り出す際にコネクションの生存を確認(DBの再起動等で切断されたコネクションを再接続)
+
+        pool_recycle : int, default=None
+            コネクションを作り直すまでの秒数(ファイアウォール等でアイドル接続が切断される環境向け)
+
+        statement_timeout : int, default=None
+            SQL文の実行時間の上限(ミリ秒)。超えた場合はPostgreSQL側で中断される
         """
         self.username = username
         self.password = password
         self.host = host
         self.port = port
         self.database = database
+        self.shared_engine = shared_engine
+        self._engine_options = _make_engine_options(pool_size=pool_size, max_overflow=max_overflow,
+                                                    pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle,
+                                                    statement_timeout=statement_timeout)
         # SQLAlchemyのengine作成
         self.engine = self._get_engine(username, password, host, port, database)
+        # スキーマ情報のキャッシュ
+        self.catalog = SchemaCatalog(self.engine, ttl=catalog_ttl, maxsize=catalog_maxsize)
+        # クエリ結果のキャッシュ
+        self.result_cache = result_cache
+        # dtype_dictごとの型変換内容のキャッシュ
+        self._dtype_plan_cache = {}
+        # 処理時間等の計測
+        self.metrics = Instrumentation(self.engine)
+        for callback in (metrics_callbacks or []):
+            self.metrics.add_callback(callback)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
         """ withブロックから抜けたら時の処理 """
+        # 共有engineは他のインスタンスが使用するため、計測用のイベントのみ解除
+        if self.shared_engine:
+            self.metrics.close()
         # エンジン破棄
-        self.engine.dispose()
+        else:
+            self.engine.dispose()
 
     def _get_engine(self, username, password, host, port, database):
         """
         SQLAlcyemyのengineを取得
         """
         engine_txt = f'postgresql://{username}:{password}@{host}:{port}/{database}'
-        return create_engine(engine_txt)    
+        if self.shared_engine:
+            return get_shared_engine(engine_txt, **self._engine_options)
+        return create_engine(engine_txt, **self._engine_options)
+
+    def _connect(self):
+        """
+        コネクションプールからSQLAlchemyのコネクションを取得(取得の待ち時間を計測)
+        """
+        with self.metrics.phase('pool_wait_time'):
+            return self.engine.connect()
+
+    def _raw_connection(self):
+        """
+        コネクションプールからpsycopg2のコネクションを取得(取得の待ち時間を計測)
+        """
+        with self.metrics.phase('pool_wait_time'):
+            return self.engine.raw_connection()
+
+    def _pool_limit(self):
+        """
+        コネクションプールから同時に取得できるコネクション数(`pool_size` + `max_overflow`。上限がなければNone)
+        """
+        pool = self.engine.pool
+        if not hasattr(pool, 'size') or getattr(pool, '_max_overflow', -1) < 0:
+            return None
+        return pool.size() + pool._max_overflow
 
     def _make_sqlalchemy_dtype(self, dtype_dict):
         """
@@ -111,25 +289,43 @@ class PandaAlchemy():
                 raise Exception(f'Values of `dtype_dict` should be strings or members of `sqlalchemy.types`. A type of {k} is {v}, so it is not available.')
         return dtype_except_dt, parse_dates
 
+    def _get_dtype_plan(self, dtype_dict):
+        """
+        dtype_dictに対応するpandasの型(`_make_pandas_dtype`の出力)を取得
+
+        同じdtype_dictに対しては初回の結果を再利用する
+        """
+        key = tuple((k, repr(v)) for k, v in dtype_dict.items())
+        if key not in self._dtype_plan_cache:
+            dtype_except_dt, parse_dates = self._make_pandas_dtype(dtype_dict)
+            dtype_except_dt = {k: pd.api.types.pandas_dtype(v) for k, v in dtype_except_dt.items()}
+            self._dtype_plan_cache[key] = (dtype_except_dt, parse_dates)
+        return self._dtype_plan_cache[key]
+
     def _convert_dataframe_dtype(self, df_src, dtype_dict):
         """
         DataFrameの型をdtype_dictに合わせて変換
+
+        変換が必要な列のみを列単位で変換し、それ以外の列は元のDataFrameとデータを共有する(元のDataFrameは変更しない)
         """
-        # 変換前の型表示
-        print('------ Pandas data types before conversion------')
-        for i, c in zip(df_src.dtypes.index, df_src.dtypes):
-            print(f'{i}  {c}')
+        # 変換前の型表示(ログレベルがDEBUGの時のみ)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Pandas data types before conversion: %s', dict(df_src.dtypes))
         # 変換後の型を取得
-        dtype_except_dt, parse_dates = self._make_pandas_dtype(dtype_dict)
+        dtype_except_dt, parse_dates = self._get_dtype_plan(dtype_dict)
+        # データをコピーせずに新たなDataFrameを作成し、変換が必要な列のみ置き換え
+        df_dst = df_src.copy(deep=False)
         # 日時型以外を変換
-        df_dst = df_src.astype(dtype_except_dt)
+        for k, dtype in dtype_except_dt.items():
+            if df_dst[k].dtype != dtype:
+                df_dst[k] = df_dst[k].astype(dtype)
         # 日時型を変換
         for k in parse_dates:
-            df_dst[k] = pd.to_datetime(df_dst[k])
-        # 変換後の型表示
-        print('------ Pandas data types after conversion------')
-        for i, c in zip(df_dst.dtypes.index, df_dst.dtypes):
-            print(f'{i}  {c}')
+            if not pd.api.types.is_datetime64_any_dtype(df_dst[k].dtype):
+                df_dst[k] = pd.to_datetime(df_dst[k])
+        # 変換後の型表示(ログレベルがDEBUGの時のみ)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Pandas data types after conversion: %s', dict(df_dst.dtypes))
         return df_dst
 
     def _convert_types(self, df_src, dtype_dict):
@@ -137,13 +333,15 @@ class PandaAlchemy():
         型指定あるとき、DataFrameを変換 & SQLAlchemyの型形式を作成
         """
         if dtype_dict is not None:
-            df_convert = self._convert_dataframe_dtype(df_src, dtype_dict)  # PandasのDataFrameを変換
+            with self.metrics.phase('conversion_time'):
+                df_convert = self._convert_dataframe_dtype(df_src, dtype_dict)  # PandasのDataFrameを変換
             sqlalchemy_dtype = self._make_sqlalchemy_dtype(dtype_dict)  # SQLAlchemyの型形式(`to_sql`メソッドのdtype引数に指定)
         else:
             df_convert = df_src  # 型指定ないとき、そのままシャローコピー
             sqlalchemy_dtype = None
         return df_convert, sqlalchemy_dtype
 
+    @instrumented
     def create_table_from_declarative_base(self, base_class):
         """
         SQLAlcemyの`declarative_base()`で生成したメタクラスからテーブル作成(https://laplace-daemon.com/basic-use-of-sqlalchemy/#toc_id_5_1)
@@ -173,50 +371,27 @@ class PandaAlchemy():
             pdalchemy = PandaAlchemy(USERNAME, PASSWORD, HOST, PORT, DB_NAME)
             pdalchemy.create_table_from_declarative_base(Base)
         """
-        # 既存テーブル一覧取得
-        current_tables = self.get_table_dict()
+        # 作成対象のテーブルが既に存在するか確認
+        existence = {table_name: self.catalog.has_table(table_data.name, schema=table_data.schema)
+                     for table_name, table_data in base_class.metadata.tables.items()}
 
         # テーブル作成(メタクラスの定義を反映)
         base_class.metadata.create_all(self.engine)
         
         # 作成結果を表示
         for table_name, table_data in base_class.metadata.tables.items():
+            self.catalog.invalidate(table_data.name, schema=table_data.schema)
             # 既存テーブルに作成したいテーブルが存在する場合、その旨を表示
-            if table_name in current_tables.keys():
+            if existence[table_name]:
                 print(f'Table `{table_name}` already exists')
             # 既存テーブルに存在しないテーブルは、新たに作成した旨を表示
             else:
                 print(f'Table `{table_name}` has been made')
 
-    def create_table_from_dtype_dict(self, table_name, dtype_dict, autoincrement=True, autoincrement_name='id'):
+    def _make_dtype_table(self, table_name, dtype_dict, autoincrement, autoincrement_name):
         """
-        型定義dictからテーブル作成
-
-        SQLAlcemyのMetaData形式のテーブル定義を使用(https://laplace-daemon.com/basic-use-of-sqlalchemy/#toc_id_5_1)
-
-        Parameters
-        ----------
-        table_name : str
-            作成したいテーブル名
-
-        dtype_dict : dict[str, str]
-            列名と型の組み合わせを指定するdict
-
-            Key: 作成したいフィールド名
-
-            Value: "Float", "Integer", "BigInteger", "Boolean", "String", "DateTime", または`sqlalchemy.types`のメンバから選択
-
-            記載例: 
-
-            >>> dtype_dict={"column1": "Float", "column2":"String", "column3": sqlalchemy.types.Date()} 
-
-        autoincrement : bool, default=True
-            Trueなら、連番のキー列を自動作成(参考:https://qiita.com/EasyCording/items/9eda4064412aa7f73567)
-
-        autoincrement_name : str, default="id"
-            autoincrementで作成された連番キー例の名称(autoincrement=Trueの時のみ有効)
+        型定義dictからテーブル定義(`sqlalchemy.Table`)を作成し、登録したMetaDataを返す
         """
-        
         # MetaDataをインスタンス化
         metadata = MetaData()
         # 列一覧を作成
@@ -248,25 +423,209 @@ class PandaAlchemy():
         column_list = tuple(column_list)
         # テーブル作成
         table = Table(table_name, metadata, *column_list)
+        return metadata
+
+    @instrumented
+    def create_table_from_dtype_dict(self, table_name, dtype_dict, autoincrement=True, autoincrement_name='id'):
+        """
+        型定義dictからテーブル作成
+
+        SQLAlcemyのMetaData形式のテーブル定義を使用(https://laplace-daemon.com/basic-use-of-sqlalchemy/#toc_id_5_1)
+
+        Parameters
+        ----------
+        table_name : str
+            作成したいテーブル名
+
+        dtype_dict : dict[str, str]
+            列名と型の組み合わせを指定するdict
+
+            Key: 作成したいフィールド名
+
+            Value: "Float", "Integer", "BigInteger", "Boolean", "String", "DateTime", または`sqlalchemy.types`のメンバから選択
+
+            記載例: 
+
+            >>> dtype_dict={"column1": "Float", "column2":"String", "column3": sqlalchemy.types.Date()} 
+
+        autoincrement : bool, default=True
+            Trueなら、連番のキー列を自動作成(参考:https://qiita.com/EasyCording/items/9eda4064412aa7f73567)
+
+        autoincrement_name : str, default="id"
+            autoincrementで作成された連番キー例の名称(autoincrement=Trueの時のみ有効)
+        """
+        
+        metadata = self._make_dtype_table(table_name, dtype_dict, autoincrement, autoincrement_name)
         metadata.create_all(self.engine)
+        self.catalog.invalidate(table_name)
         
         print(f'Table `{table_name}` has been made')
 
-    def create_table_from_df(self, df, table_name, dtype_dict=None):
+    @instrumented
+    def create_table_from_df(self, df, table_name, dtype_dict=None, sample_rows=1000, size_strings=False):
         """
         PandasのDataFrameからテーブルを作成
+
+        DataFrameの列の型(およびdtype_dict)から`to_sql`と同じ対応関係でCREATE TABLE文を作成して実行する(データは送信しない)
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            テーブル定義の元となるDataFrame
+
+        table_name : str
+            作成したいテーブル名
+
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`insert_from_df`と同様)。指定のない列はDataFrameの列の型から推定
+
+        sample_rows : int, default=1000
+            型の推定(object型の列の中身の判定等)に使用する先頭からの行数。Noneなら全行を使用
+
+        size_strings : bool, default=False
+            Trueなら、文字列型の列を`sample_rows`行内の最大文字数の`VARCHAR(n)`で作成(Falseなら長さ制限なし)
+
+            サンプル外により長い文字列がある場合、データ追加時にエラーとなるので注意
         """
-        # 型指定あるとき、DataFrameを変換 & SQLAlchemyの型形式を作成
-        df_convert, sqlalchemy_dtype = self._convert_types(df, dtype_dict)
-        # `pandas.DataFrame.to_sql`でPostgresにテーブル作成
-        df_convert.to_sql(table_name, self.engine, if_exists='fail', index=False,
-                          dtype=sqlalchemy_dtype)
-        # データを削除(型指定した空のテーブルのみが残る)
-        self.truncate_table(table_name)
+        # 同名のテーブルがあればエラー(`to_sql(if_exists='fail')`と同様)
+        if self.catalog.has_table(table_name):
+            raise ValueError(f"Table '{table_name}' already exists.")
+        # 型推定用のサンプルを型変換 & SQLAlchemyの型形式を作成
+        df_sample = df if sample_rows is None else df.head(sample_rows)
+        df_convert, sqlalchemy_dtype = self._convert_types(df_sample, dtype_dict)
+        # 文字列型の列の長さをサンプル内の最大文字数に設定
+        if size_strings:
+            sqlalchemy_dtype = dict(sqlalchemy_dtype) if sqlalchemy_dtype is not None else {}
+            for k in df_convert.columns:
+                v = sqlalchemy_dtype.get(k)
+                if v is None and pd.api.types.infer_dtype(df_convert[k], skipna=True) != 'string':
+                    continue
+                if v is not None and not (isinstance(v, String) and v.length is None):
+                    continue
+                max_length = df_convert[k].dropna().astype(str).str.len().max()
+                if pd.notna(max_length):
+                    sqlalchemy_dtype[k] = String(int(max_length))
+        # `to_sql`と同じ型の対応関係でCREATE TABLE文を作成して実行
+        ddl = pd.io.sql.get_schema(df_convert, table_name, con=self.engine, dtype=sqlalchemy_dtype)
+        with self._connect() as conn, conn.begin():
+            conn.execute(sqlalchemy.text(ddl))
+        self.catalog.invalidate(table_name)
 
         print(f'Table `{table_name}` has been made')
 
-    def insert_from_df(self, df, table_name, dtype_dict=None):
+    def _copy_from_df(self, cursor, df, table_name, chunksize=None):
+        """
+        `COPY ... FROM STDIN`(CSV形式)でDataFrameをテーブルにデータ追加
+
+        `cursor`はpsycopg2のカーソル(トランザクション管理は呼出元で実施)。転送したバイト数を返す
+        """
+        # 識別子をクオート(`to_sql`と同様に大文字等を含む名称に対応)
+        preparer = self.engine.dialect.identifier_preparer
+        columns = ', '.join(preparer.quote(str(c)) for c in df.columns)
+        sql = f"COPY {preparer.quote(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        # chunksize行ごとにCSV化して送信(CSVテキストのメモリ使用量を抑える)
+        if chunksize is None:
+            chunksize = self.COPY_CHUNKSIZE
+        n_bytes = 0
+        for start in range(0, len(df), chunksize):
+            buf = io.StringIO()
+            df.iloc[start:start + chunksize].to_csv(buf, header=False, index=False, na_rep='\\N')
+            n_bytes += buf.tell()
+            buf.seek(0)
+            with self.metrics.phase('db_time'):
+                cursor.copy_expert(sql, buf)
+        self.metrics.add('bytes', n_bytes)
+        return n_bytes
+
+    def _copy_binary_from_df(self, cursor, df, table_name, chunksize=None, column_types=None):
+        """
+        `COPY ... FROM STDIN`(バイナリ形式)でDataFrameをテーブルにデータ追加
+
+        転送先テーブルの列の型に合わせて`encode_binary_copy`でバイナリ化する。転送したバイト数を返す
+
+        `column_types`を指定しない場合、転送先テーブルの列の型を`self.catalog`から取得
+        """
+        # 転送先テーブルの列の型を取得(バイナリ形式は型を厳密に一致させる必要がある)
+        if column_types is None:
+            table_columns = self.catalog.get_columns(table_name)
+            column_types = [table_columns[str(c)] for c in df.columns]
+        preparer = self.engine.dialect.identifier_preparer
+        columns = ', '.join(preparer.quote(str(c)) for c in df.columns)
+        sql = f"COPY {preparer.quote(table_name)} ({columns}) FROM STDIN WITH (FORMAT binary)"
+        # chunksize行ごとにバイナリ化して送信
+        if chunksize is None:
+            chunksize = self.COPY_CHUNKSIZE
+        n_bytes = 0
+        for start in range(0, len(df), chunksize):
+            data = encode_binary_copy(df.iloc[start:start + chunksize], column_types)
+            n_bytes += len(data)
+            with self.metrics.phase('db_time'):
+                cursor.copy_expert(sql, io.BytesIO(data))
+        self.metrics.add('bytes', n_bytes)
+        return n_bytes
+
+    def _get_result_cache_tables(self, sql):
+        """
+        結果キャッシュの破棄に使用する、クエリが参照しているテーブル名のリストを取得
+
+        参照しているテーブルを判定できない、テーブルを参照しない(関数のみ等)、またはビュー等のテーブル以外を参照するクエリは、
+        元のテーブルの変更時に結果キャッシュを破棄できないためNoneを返す(結果をキャッシュしない)
+        """
+        tables = _extract_tables(sql)
+        if not tables or not all(self.catalog.is_base_table(table) for table in tables):
+            return None
+        return tables
+
+    def _invalidate_result_cache(self, table_name):
+        """
+        データを変更したテーブルを参照している結果キャッシュを破棄
+        """
+        if self.result_cache is not None:
+            self.result_cache.invalidate_table(table_name)
+
+    def _create_table_if_not_exists(self, df, table_name, sqlalchemy_dtype):
+        """
+        テーブルが存在しないとき、`to_sql`でDataFrameの列に合わせた空のテーブルを作成
+        """
+        if not self.catalog.has_table(table_name):
+            df.head(0).to_sql(table_name, self.engine, if_exists='fail', index=False,
+                              dtype=sqlalchemy_dtype)
+            self.catalog.invalidate(table_name)
+
+    def _write_df(self, df, table_name, sqlalchemy_dtype, method, chunksize):
+        """
+        型変換済のDataFrameを1トランザクションでテーブルに追加し、転送したバイト数を返す(`to_sql`の場合はNone)
+        """
+        # `pandas.DataFrame.to_sql`でPostgresテーブルにデータ追加
+        if method is None:
+            with self._connect() as conn, conn.begin():
+                df.to_sql(table_name, conn, if_exists='append', index=False,
+                          dtype=sqlalchemy_dtype, chunksize=chunksize)
+            self.catalog.invalidate(table_name)  # テーブルが新たに作成された可能性があるため破棄
+            return None
+        # `COPY ... FROM STDIN`でPostgresテーブルにデータ追加
+        elif method in ('copy', 'binary'):
+            # psycopg2のコネクションで転送し、最後にまとめてコミット
+            conn = self._raw_connection()
+            try:
+                cursor = conn.cursor()
+                if method == 'copy':
+                    n_bytes = self._copy_from_df(cursor, df, table_name, chunksize=chunksize)
+                else:
+                    n_bytes = self._copy_binary_from_df(cursor, df, table_name, chunksize=chunksize)
+                cursor.close()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            return n_bytes
+        else:
+            raise Exception(f'`method` should be None, "copy" or "binary", but {method} is specified.')
+
+    @instrumented
+    def insert_from_df(self, df, table_name, dtype_dict=None, method=None, chunksize=None):
         """
         pandas.DataFrameからDBのテーブルにデータ追加
 
@@ -290,15 +649,688 @@ class PandaAlchemy():
             記載例: 
 
             >>> dtype_dict={"column1": "Float", "column2":"String", "column3": sqlalchemy.types.Date()} 
+
+        method : {None, "copy", "binary"}, default=None
+            データ追加方法
+
+            None: `pandas.DataFrame.to_sql`で1行ずつINSERT
+
+            "copy": PostgreSQLの`COPY ... FROM STDIN`でCSV形式のデータを一括転送(大量データ向け。テーブルが存在しない場合は`to_sql`と同様に作成)
+
+            "binary": PostgreSQLの`COPY ... FROM STDIN`でバイナリ形式のデータを一括転送(数値・日時の多いデータ向け。値をテキスト化しないため"copy"より高速)
+            (timestamptzの列にはタイムゾーン付きの日時のみ転送可能)
+
+        chunksize : int, default=None
+            1回の送信で扱う行数(Noneなら`to_sql`は全行一括、"copy"および"binary"は`COPY_CHUNKSIZE`行ずつ)
         """
+        start_time = time.perf_counter()
         # 型指定あるとき、DataFrameを変換 & SQLAlchemyの型形式を作成
         df_convert, sqlalchemy_dtype = self._convert_types(df, dtype_dict)
-        # `pandas.DataFrame.to_sql`でPostgresテーブルにデータ追加
-        df_convert.to_sql(table_name, self.engine, if_exists='append', index=False,
-                          dtype=sqlalchemy_dtype)
+        # `COPY`のときはテーブルを事前に作成(`to_sql`は自動で作成される)
+        if method in ('copy', 'binary'):
+            self._create_table_if_not_exists(df_convert, table_name, sqlalchemy_dtype)
+        self._write_df(df_convert, table_name, sqlalchemy_dtype, method, chunksize)
+        self._invalidate_result_cache(table_name)
+        self.metrics.add('rows', len(df_convert))
         
-        print(f'Add {len(df_convert)} records to table `{table_name}`')
+        elapsed = time.perf_counter() - start_time
+        print(f'Add {len(df_convert)} records to table `{table_name}` ({len(df_convert) / max(elapsed, 1e-9):.0f} records/s)')
+
+    def _is_retryable_error(self, error):
+        """
+        リトライで成功し得る例外(接続断、タイムアウト等の一時的なエラー)か判定
+
+        制約違反、不正な値、構文エラー等は何度実行しても失敗するためリトライしない
+        """
+        if isinstance(error, (sqlalchemy.exc.DisconnectionError, sqlalchemy.exc.OperationalError,
+                              sqlalchemy.exc.TimeoutError)):
+            return True
+        if isinstance(error, sqlalchemy.exc.DBAPIError):
+            return error.connection_invalidated
+        # `COPY`はpsycopg2のカーソルで実行するため、ドライバの例外も判定
+        dbapi = getattr(self.engine.dialect, 'loaded_dbapi', None) or self.engine.dialect.dbapi
+        return isinstance(error, (dbapi.OperationalError, dbapi.InterfaceError))
+
+    @instrumented
+    def insert_from_df_parallel(self, df, table_name, dtype_dict=None, method='copy', chunksize=None,
+                                max_workers=4, max_retries=3, retry_interval=1.0):
+        """
+        pandas.DataFrameを分割し、複数のコネクションで並列にDBのテーブルにデータ追加
+
+        分割したチャンクごとに別トランザクションでコミットし、接続断等の一時的なエラーで失敗したチャンクはリトライする
+        (制約違反等の再実行しても失敗するエラーはリトライしない)。
+        リトライ後も失敗したチャンクは戻り値の`failed_chunks`に記録されるため、該当行のみ再投入できる
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            追加対象のDataFrame
+
+        table_name : str
+            データを追加したいテーブル名
+
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`insert_from_df`と同様)
+
+        method : {None, "copy", "binary"}, default="copy"
+            各チャンクのデータ追加方法(`insert_from_df`と同様)
+
+        chunksize : int, default=None
+            1チャンク(1トランザクション)の行数(Noneなら`COPY_CHUNKSIZE`)
+
+        max_workers : int, default=4
+            並列数(同時に使用するコネクション数)
+
+        max_retries : int, default=3
+            チャンクごとの最大リトライ回数(接続断、タイムアウト等の一時的なエラーのみリトライ)
+
+        retry_interval : float, default=1.0
+            リトライまでの待機秒数(リトライのたびに2倍に延長)
+
+        Returns
+        ----------
+        dict
+            処理結果
+
+            "records": 追加に成功した行数, "bytes": 転送したバイト数("copy", "binary"のみ), "seconds": 処理時間(秒),
+            "records_per_sec": 処理速度(行/秒), "chunks": チャンク数,
+            "failed_chunks": 失敗したチャンクのリスト(各要素は"chunk": チャンク番号, "start", "stop": 行の範囲(`df.iloc[start:stop]`), "error": 最後の例外)
+        """
+        start_time = time.perf_counter()
+        # 型指定あるとき、DataFrameを変換 & SQLAlchemyの型形式を作成
+        df_convert, sqlalchemy_dtype = self._convert_types(df, dtype_dict)
+        # テーブルが存在しないとき、並列書込前に作成
+        self._create_table_if_not_exists(df_convert, table_name, sqlalchemy_dtype)
+        if chunksize is None:
+            chunksize = self.COPY_CHUNKSIZE
+
+        record = self.metrics.current  # 各スレッドの計測値を本操作の記録に加算
+
+        def write_chunk(start):
+            """1チャンク分をリトライ付きで追加"""
+            for attempt in range(max_retries + 1):
+                try:
+                    with self.metrics.attach(record):
+                        return self._write_df(df_convert.iloc[start:start + chunksize], table_name,
+                                              sqlalchemy_dtype, method, None)
+                except Exception as e:
+                    if attempt == max_retries or not self._is_retryable_error(e):
+                        raise
+                    print(f'Chunk starting at row {start} failed ({e}). Retrying ({attempt + 1}/{max_retries})')
+                    time.sleep(retry_interval * 2 ** attempt)
+
+        # チャンクごとに並列で追加
+        starts = list(range(0, len(df_convert), chunksize))
+        report = {'records': 0, 'bytes': 0, 'seconds': None, 'records_per_sec': None,
+                  'chunks': len(starts), 'failed_chunks': []}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(write_chunk, start) for start in starts]
+            for i, (start, future) in enumerate(zip(starts, futures)):
+                stop = min(start + chunksize, len(df_convert))
+                try:
+                    n_bytes = future.result()
+                except Exception as e:
+                    report['failed_chunks'].append({'chunk': i, 'start': start, 'stop': stop, 'error': e})
+                else:
+                    report['records'] += stop - start
+                    report['bytes'] = None if n_bytes is None else report['bytes'] + n_bytes
+        self._invalidate_result_cache(table_name)
+        self.metrics.add('rows', report['records'])
+        elapsed = time.perf_counter() - start_time
+        report['seconds'] = elapsed
+        report['records_per_sec'] = report['records'] / max(elapsed, 1e-9)
+
+        print(f'Add {report["records"]} records to table `{table_name}` ({report["records_per_sec"]:.0f} records/s)')
+        if len(report['failed_chunks']) > 0:
+            print(f'{len(report["failed_chunks"])} of {len(starts)} chunks failed')
+        return report
+
+    def _select_copy_method(self, table, df):
+        """
+        転送先テーブルの列の型から`insert_many(method="auto")`の転送方法を決定
+
+        全列がバイナリ形式に対応していれば"binary"、それ以外は"copy"
+        (タイムゾーンなしの日時をtimestamptzの列に転送する場合は、セッションのタイムゾーンで解釈されるよう"copy")
+        """
+        try:
+            for column in table.columns:
+                _get_binary_format(column.type)
+        except Exception:
+            return 'copy'
+        for c in df.columns:
+            if str(c) in table.columns and _needs_session_timezone(df[c], table.columns[str(c)].type):
+                return 'copy'
+        return 'binary'
+
+    @instrumented
+    def insert_many(self, tables, method='auto', chunksize=None):
+        """
+        複数のpandas.DataFrameを、1つのコネクション・1トランザクションでそれぞれのテーブルにデータ追加
+
+        外部キーで参照されるテーブルから順に追加し、途中で失敗した場合は全テーブルの追加をロールバックする
+        (他のセッションから追加途中の状態は参照されない)
+
+        記載例:
+
+        >>> pdalchemy.insert_many({'customer': (df_customer, None), 'sales': (df_sales, {'amount': 'Float'})})
+
+        Parameters
+        ----------
+        tables : dict[str, tuple(pandas.DataFrame, dict)]
+            テーブル名と、(追加対象のDataFrame, dtype_dict)の組み合わせを指定するdict
+
+            dtype_dictは`insert_from_df`と同様(Noneなら型指定なし)。値をDataFrameのみとすることも可能
+
+            存在しないテーブルは同じトランザクション内で`to_sql`と同様に作成
+
+        method : {"auto", None, "copy", "binary"}, default="auto"
+            各テーブルのデータ追加方法(`insert_from_df`と同様)
+
+            "auto": 転送先テーブルの全列がバイナリ形式に対応していれば"binary"、それ以外は"copy"
+            (タイムゾーンなしの日時をtimestamptzの列に転送する場合も"copy")
+
+        chunksize : int, default=None
+            1回の送信で扱う行数(`insert_from_df`と同様)
+        """
+        start_time = time.perf_counter()
+        if method not in ('auto', None, 'copy', 'binary'):
+            raise Exception(f'`method` should be "auto", None, "copy" or "binary", but {method} is specified.')
+        # 型指定あるとき、DataFrameを変換 & SQLAlchemyの型形式を作成
+        converted = {}
+        for table_name, value in tables.items():
+            df, dtype_dict = value if isinstance(value, tuple) else (value, None)
+            converted[table_name] = self._convert_types(df, dtype_dict)
+
+        methods = {}
+        try:
+            with self._connect() as conn, conn.begin():
+                # 存在しないテーブルを作成(失敗時は作成もロールバック)
+                for table_name, (df_convert, sqlalchemy_dtype) in converted.items():
+                    if not self.catalog.has_table(table_name):
+                        df_convert.head(0).to_sql(table_name, conn, if_exists='fail', index=False,
+                                                  dtype=sqlalchemy_dtype)
+                # 外部キーの依存関係から、参照されるテーブルが先になるよう並べ替え
+                metadata = MetaData()
+                metadata.reflect(conn, only=list(converted))
+                ordered = [table for table in metadata.sorted_tables
+                           if table.name in converted]
+                # SQLAlchemyのコネクションと同じトランザクション上のpsycopg2のカーソルで`COPY`を実行
+                cursor = conn.connection.cursor()
+                for table in ordered:
+                    df_convert, sqlalchemy_dtype = converted[table.name]
+                    methods[table.name] = self._select_copy_method(table, df_convert) if method == 'auto' else method
+                    if methods[table.name] is None:
+                        df_convert.to_sql(table.name, conn, if_exists='append', index=False,
+                                          dtype=sqlalchemy_dtype, chunksize=chunksize)
+                    elif methods[table.name] == 'copy':
+                        self._copy_from_df(cursor, df_convert, table.name, chunksize=chunksize)
+                    else:
+                        column_types = [table.columns[str(c)].type for c in df_convert.columns]
+                        self._copy_binary_from_df(cursor, df_convert, table.name, chunksize=chunksize,
+                                                  column_types=column_types)
+                cursor.close()
+        finally:
+            # テーブルの作成・データ追加の成否によらずキャッシュを破棄
+            for table_name in converted:
+                self.catalog.invalidate(table_name)
+                self._invalidate_result_cache(table_name)
+        n_records = sum(len(df_convert) for df_convert, _ in converted.values())
+        self.metrics.add('rows', n_records)
+
+        elapsed = time.perf_counter() - start_time
+        for table_name in methods:
+            print(f'Add {len(converted[table_name][0])} records to table `{table_name}` (method={methods[table_name]})')
+        print(f'Add {n_records} records to {len(methods)} tables in one transaction ({n_records / max(elapsed, 1e-9):.0f} records/s)')
+
+    def _import_one_file(self, path, table_name, file_format, column_types, default_type, block_size, chunksize):
+        """
+        1ファイルを逐次読み込みながら`COPY ... FROM STDIN`(CSV形式)で1トランザクションでテーブルに追加し、(行数, バイト数)を返す
+        """
+        preparer = self.engine.dialect.identifier_preparer
+        n_records = 0
+        n_bytes = 0
+        conn = self._raw_connection()
+        try:
+            cursor = conn.cursor()
+            for batch in iter_file_batches(path, file_format=file_format, column_types=column_types,
+                                           block_size=block_size, batch_size=chunksize, default_type=default_type):
+                columns = ', '.join(preparer.quote(name) for name in batch.schema.names)
+                data = batch_to_copy_csv(batch)
+                with self.metrics.phase('db_time'):
+                    cursor.copy_expert(f'COPY {preparer.quote(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                                       io.BytesIO(data))
+                n_records += batch.num_rows
+                n_bytes += len(data)
+            cursor.close()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return n_records, n_bytes
+
+    @instrumented
+    def import_file(self, path_or_glob, table_name, dtype_dict=None, file_format=None, block_size=None,
+                    chunksize=None, max_workers=4):
+        """
+        CSVまたはParquetファイルを、pandasを経由せずに逐次読み込みながらDBのテーブルに追加
+
+        ファイルを`block_size`バイト(Parquetは`chunksize`行)ずつArrow形式で読み込み、`COPY ... FROM STDIN`で転送するため、
+        ファイルサイズによらずメモリ使用量は一定(PyArrowが必要)。
+        複数ファイルは並列に処理し、ファイルごとに1トランザクションでコミットする(失敗したファイルは戻り値の`failed_files`に記録)
+
+        記載例:
+
+        >>> pdalchemy.import_file('./drop/sales_*.csv', 'sales', dtype_dict={'amount': 'Float', 'sold_at': 'DateTime'})
+
+        Parameters
+        ----------
+        path_or_glob : str
+            読み込むファイルのパス、またはワイルドカードを含むパターン
+
+        table_name : str
+            データを追加したいテーブル名(存在しない場合は、先頭のファイルの列と`dtype_dict`から作成)
 
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`insert_from_df`と同様)。読込時に指定の型に変換し、変換できない値があればエラー
+
+            指定のない列は、テーブルが存在すればテーブルの列の型(真偽値、日時等は文字列として読み込み、DB側で変換)で読み込む。
+            テーブルが存在しなければ、CSVは文字列(TEXT型の列を作成)、Parquetはファイルの型で読み込む
+
+        file_format : {None, "csv", "parquet"}, default=None
+            ファイル形式(Noneなら拡張子から判定。".parquet", ".pq"以外はCSV)
+
+        block_size : int, default=None
+            CSVで1回に読み込むバイト数(Noneなら`IMPORT_BLOCK_SIZE`)
+
+        chunksize : int, default=None
+            Parquetで1回に読み込む行数(Noneなら`COPY_CHUNKSIZE`)
+
+        max_workers : int, default=4
+            並列数(同時に処理するファイル数、使用するコネクション数)
+
+        Returns
+        ----------
+        dict
+            処理結果
+
+            "records": 追加に成功した行数, "bytes": 転送したバイト数, "seconds": 処理時間(秒), "records_per_sec": 処理速度(行/秒),
+            "files": 追加に成功したファイルのパスのリスト, "failed_files": 失敗したファイルのリスト(各要素は"path": パス, "error": 例外)
+        """
+        _check_pyarrow()
+        start_time = time.perf_counter()
+        paths = sorted(glob.glob(path_or_glob)) if glob.has_magic(path_or_glob) else [path_or_glob]
+        if len(paths) == 0:
+            raise Exception(f'No files match `{path_or_glob}`.')
+        if block_size is None:
+            block_size = self.IMPORT_BLOCK_SIZE
+        if chunksize is None:
+            chunksize = self.COPY_CHUNKSIZE
+        # dtype_dictの型をArrowの型に変換(対応するArrowの型がない列は変換しない)
+        column_types = {}
+        for name, dtype in (dtype_dict or {}).items():
+            arrow_type = arrow_type_from_dtype(dtype)
+            if arrow_type is not None:
+                column_types[name] = arrow_type
+        # テーブルが存在するとき、dtype_dictで指定のない列はテーブルの列の型で読み込む
+        # (真偽値、日時はArrowよりPostgreSQLの方が受け付ける書式が多いため、対応するArrowの型がない列と同様に文字列で読み込む)
+        if self.catalog.has_table(table_name):
+            for name, column_type in self.catalog.get_columns(table_name).items():
+                if name not in column_types:
+                    arrow_type = None
+                    if not isinstance(column_type, (sqlalchemy.types.Boolean, sqlalchemy.types.DateTime,
+                                                    sqlalchemy.types.Date)):
+                        arrow_type = arrow_type_from_dtype(column_type)
+                    column_types[name] = arrow_type or pa.string()
+            default_type = None
+        # テーブルが存在しないとき、CSVの型指定のない列は文字列として読み込み(先頭のブロックから型を推定しない)、
+        # 読み込めた最初のファイルの列から空のテーブルを作成
+        else:
+            default_type = pa.string()
+            first_batch = None
+            errors = []
+            for path in paths:
+                try:
+                    first_batch = next(iter_file_batches(path, file_format=file_format, column_types=column_types,
+                                                         block_size=block_size, batch_size=chunksize,
+                                                         default_type=default_type), None)
+                except Exception as e:
+                    errors.append(e)
+                if first_batch is not None:
+                    break
+            if first_batch is None:
+                if len(errors) > 0:
+                    raise errors[0]
+                raise Exception(f'Table `{table_name}` cannot be made because all files are empty.')
+            sqlalchemy_dtype = self._make_sqlalchemy_dtype(dtype_dict) if dtype_dict is not None else None
+            self._create_table_if_not_exists(first_batch.slice(0, 0).to_pandas(), table_name, sqlalchemy_dtype)
+
+        record = self.metrics.current  # 各スレッドの計測値を本操作の記録に加算
+
+        def import_one(path):
+            with self.metrics.attach(record):
+                return self._import_one_file(path, table_name, file_format, column_types, default_type,
+                                             block_size, chunksize)
+
+        # ファイルごとに並列で追加
+        report = {'records': 0, 'bytes': 0, 'seconds': None, 'records_per_sec': None, 'files': [], 'failed_files': []}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(import_one, path) for path in paths]
+            for path, future in zip(paths, futures):
+                try:
+                    n_records, n_bytes = future.result()
+                except Exception as e:
+                    report['failed_files'].append({'path': path, 'error': e})
+                else:
+                    report['records'] += n_records
+                    report['bytes'] += n_bytes
+                    report['files'].append(path)
+        self._invalidate_result_cache(table_name)
+        self.metrics.add('rows', report['records'])
+        self.metrics.add('bytes', report['bytes'])
+        elapsed = time.perf_counter() - start_time
+        report['seconds'] = elapsed
+        report['records_per_sec'] = report['records'] / max(elapsed, 1e-9)
+
+        print(f'Add {report["records"]} records from {len(report["files"])} files to table `{table_name}` ({report["records_per_sec"]:.0f} records/s)')
+        if len(report['failed_files']) > 0:
+            print(f'{len(report["failed_files"])} of {len(paths)} files failed')
+        return report
+
+    @instrumented
+    def upsert_from_df(self, df, table_name, key_columns, dtype_dict=None, update_columns=None,
+                       delete_missing=False, method='copy', chunksize=None):
+        """
+        pandas.DataFrameの内容でDBのテーブルを更新(キーが一致する行は更新し、それ以外の行は追加)
+
+        DataFrameを一時テーブルに`COPY`で一括転送した後、`INSERT ... ON CONFLICT DO UPDATE`で1回で反映する。
+        全処理を1トランザクションで実行し、失敗時は全てロールバックする
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            反映対象のDataFrame(`key_columns`の値は行ごとに一意である必要がある)
+
+        table_name : str
+            更新したいテーブル名(`key_columns`に主キーまたはユニーク制約が必要)
+
+        key_columns : str or list[str]
+            行の一致判定に使用する列名
+
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`insert_from_df`と同様)
+
+        update_columns : list[str], default=None
+            キーが一致した行で更新する列名(Noneなら`key_columns`以外の全列。空リストなら更新せず追加のみ)
+
+        delete_missing : bool, default=False
+            Trueなら、DataFrameにキーが存在しない行をテーブルから削除(テーブルをDataFrameの内容と一致させる)
+
+        method : {"copy", "binary"}, default="copy"
+            一時テーブルへの転送方法(`insert_from_df`と同様)
+
+        chunksize : int, default=None
+            1回の`COPY`で送信する行数(Noneなら`COPY_CHUNKSIZE`)
+        """
+        start_time = time.perf_counter()
+        if method not in ('copy', 'binary'):
+            raise Exception(f'`method` should be "copy" or "binary", but {method} is specified.')
+        if isinstance(key_columns, str):
+            key_columns = [key_columns]
+        # 型指定あるとき、DataFrameを変換
+        df_convert, _ = self._convert_types(df, dtype_dict)
+        columns = [str(c) for c in df_convert.columns]
+        if update_columns is None:
+            update_columns = [c for c in columns if c not in key_columns]
+        # SQL文を作成
+        preparer = self.engine.dialect.identifier_preparer
+        target = preparer.quote(table_name)
+        staging = preparer.quote(f'_pdalchemy_staging_{table_name}')
+        column_list = ', '.join(preparer.quote(c) for c in columns)
+        key_list = ', '.join(preparer.quote(c) for c in key_columns)
+        if len(update_columns) > 0:
+            on_conflict = 'DO UPDATE SET ' + ', '.join(f'{preparer.quote(c)} = EXCLUDED.{preparer.quote(c)}'
+                                                       for c in update_columns)
+        else:
+            on_conflict = 'DO NOTHING'
+        key_match = ' AND '.join(f's.{preparer.quote(c)} = t.{preparer.quote(c)}' for c in key_columns)
+
+        conn = self._raw_connection()
+        try:
+            cursor = conn.cursor()
+            # 転送先と同じ型の一時テーブルを作成(制約やデフォルト値は引き継がない。コミット時に自動削除)
+            cursor.execute(f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+                           f'SELECT {column_list} FROM {target} WITH NO DATA')
+            # 一時テーブルに一括転送
+            if method == 'copy':
+                self._copy_from_df(cursor, df_convert, f'_pdalchemy_staging_{table_name}', chunksize=chunksize)
+            else:
+                table_columns = self.catalog.get_columns(table_name)
+                self._copy_binary_from_df(cursor, df_convert, f'_pdalchemy_staging_{table_name}', chunksize=chunksize,
+                                          column_types=[table_columns[c] for c in columns])
+            cursor.execute(f'ANALYZE {staging}')
+            # 一時テーブルからテーブルに反映
+            cursor.execute(f'INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {staging} '
+                           f'ON CONFLICT ({key_list}) {on_conflict}')
+            n_upserted = cursor.rowcount
+            # DataFrameに存在しない行を削除
+            n_deleted = 0
+            if delete_missing:
+                cursor.execute(f'DELETE FROM {target} AS t WHERE NOT EXISTS (SELECT 1 FROM {staging} AS s WHERE {key_match})')
+                n_deleted = cursor.rowcount
+            cursor.close()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self._invalidate_result_cache(table_name)
+        self.metrics.add('rows', len(df_convert))
+
+        elapsed = time.perf_counter() - start_time
+        print(f'Upsert {n_upserted} records to table `{table_name}` ({len(df_convert) / max(elapsed, 1e-9):.0f} records/s)')
+        if delete_missing:
+            print(f'Delete {n_deleted} records from table `{table_name}`')
+
+    def _restore_bulk_load(self, state):
+        """
+        `bulk_load`で変更したテーブルの設定を元に戻す(ログ出力の再開 → インデックスの再作成 → 外部キー制約の再作成 → ANALYZE)
+
+        一部のSQLが失敗しても残りの処理は続行し、(検証に失敗した外部キー制約の(テーブル名, 制約名, 例外)のリスト,
+        失敗したSQLの(SQL文, 例外)のリスト)を返す
+        """
+        maintenance_settings = []
+        if state['maintenance_work_mem'] is not None:
+            maintenance_settings.append(('maintenance_work_mem', state['maintenance_work_mem']))
+        if state['parallel_maintenance_workers'] is not None:
+            maintenance_settings.append(('max_parallel_maintenance_workers', state['parallel_maintenance_workers']))
+        failed = []
+
+        def execute(statement, settings=()):
+            """1つのコネクション・1トランザクションでSQL文を実行(失敗したら`failed`に記録し、Falseを返す)"""
+            try:
+                conn = self._raw_connection()
+                try:
+                    cursor = conn.cursor()
+                    for name, value in settings:
+                        cursor.execute(f'SET {name} = %s', (str(value),))
+                    cursor.execute(statement)
+                    cursor.close()
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.close()
+            except Exception as e:
+                failed.append((statement, e))
+                return False
+            return True
+
+        # ログ出力を再開(ログ出力するテーブルは、ログ出力しないテーブルを参照できないため外部キー制約より先に実施)
+        for table in state['unlogged']:
+            execute(f'ALTER TABLE {table} SET LOGGED')
+        # インデックスを並列に再作成(同じテーブルの複数のインデックスも同時に作成可能)
+        indexes = [definition for _, definition in state['indexes']]
+        if len(indexes) > 0:
+            max_workers = min(state['max_workers'] or len(indexes), len(indexes))
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                list(pool.map(lambda definition: execute(definition, maintenance_settings), indexes))
+        # 外部キー制約を再作成し、既存の行を検証(違反する行がある場合も、制約は未検証(NOT VALID)の状態で残す)
+        invalid = []
+        for table, name, definition, validated in state['foreign_keys']:
+            if not execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID'):
+                # 手動で戻す際は、削除前の状態(検証済なら検証も行う)で再作成する
+                if validated:
+                    failed[-1] = (f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}', failed[-1][1])
+                continue
+            # 削除前から未検証だった制約は、未検証のまま戻す
+            if validated and not execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}', maintenance_settings):
+                invalid.append((table, name, failed.pop()[1]))
+        # 統計情報を更新
+        if state['analyze']:
+            for table in state['tables']:
+                execute(f'ANALYZE {table}')
+        return invalid, failed
+
+    @contextmanager
+    def bulk_load(self, table_names, unlogged=False, drop_indexes=True, drop_foreign_keys=True,
+                  maintenance_work_mem='1GB', parallel_maintenance_workers=None, max_workers=None, analyze=True):
+        """
+        大量データの初期投入用に、テーブルのインデックス・外部キー制約を一時的に削除するコンテキストマネージャ
+
+        withブロック内でのデータ追加は、行ごとのインデックス更新と制約の検証を行わない。
+        withブロックを抜ける際(例外発生時を含む)に、削除したインデックスを並列に再作成し、外部キー制約を再作成して、ANALYZEを実行する
+
+        追加した行が外部キー制約に違反する場合、制約は未検証(NOT VALID)の状態で再作成し、例外を返す。
+        一部のインデックス等を元に戻せなかった場合も残りは元に戻し、失敗したSQLを表示して例外を返す
+        (withブロック内で例外が発生していた場合は、その例外を優先し、これらはメッセージの表示のみとする)。
+        削除前から未検証だった外部キー制約は、検証せずに未検証のまま再作成する
+
+        記載例:
+
+        >>> with pdalchemy.bulk_load(['customer', 'sales'], unlogged=True):
+        >>>     pdalchemy.insert_from_df(df_customer, 'customer', method='binary')
+        >>>     pdalchemy.insert_from_df(df_sales, 'sales', method='binary')
+
+        Parameters
+        ----------
+        table_names : str or list[str]
+            対象のテーブル名
+
+        unlogged : bool, default=False
+            Trueなら、withブロック内は対象のテーブルをログ(WAL)を出力しないテーブル(UNLOGGED)に変更する
+
+            変更時と戻す際にテーブルが書き直されるため、作成直後の空のテーブルへの投入向け。
+            外部キー制約があるテーブルは`drop_foreign_keys=True`とする必要がある
+
+        drop_indexes : bool, default=True
+            Trueなら、制約(主キー、ユニーク制約等)に使用されていないインデックスを削除し、withブロックを抜ける際に再作成
+
+        drop_foreign_keys : bool, default=True
+            Trueなら、対象のテーブルから参照する外部キー制約と、対象のテーブルを参照する外部キー制約を削除し、withブロックを抜ける際に再作成
+
+        maintenance_work_mem : str, default="1GB"
+            インデックス・外部キー制約の再作成時のセッションの`maintenance_work_mem`(Noneならサーバの設定値)
+
+        parallel_maintenance_workers : int, default=None
+            1つのインデックスの作成に使用するサーバのワーカー数(`max_parallel_maintenance_workers`。Noneならサーバの設定値)
+
+        max_workers : int, default=None
+            同時に再作成するインデックス数(使用するコネクション数。Noneなら全インデックスを同時に作成)
+
+        analyze : bool, default=True
+            Trueなら、withブロックを抜ける際に対象のテーブルでANALYZEを実行
+
+        Yields
+        ----------
+        dict
+            削除した内容("tables": 対象のテーブル, "indexes": (インデックス名, 作成SQL)のリスト,
+            "foreign_keys": (テーブル名, 制約名, 定義, 検証済か)のリスト, "unlogged": UNLOGGEDに変更したテーブル)
+        """
+        if isinstance(table_names, str):
+            table_names = [table_names]
+        state = {'tables': [], 'indexes': [], 'foreign_keys': [], 'unlogged': [],
+                 'maintenance_work_mem': maintenance_work_mem, 'parallel_maintenance_workers': parallel_maintenance_workers,
+                 'max_workers': max_workers, 'analyze': analyze}
+        # 削除する内容を記録し、1トランザクションで削除(失敗時は全てロールバック)
+        conn = self._raw_connection()
+        try:
+            cursor = conn.cursor()
+            for table_name in table_names:
+                cursor.execute('SELECT oid::regclass::text, relpersistence FROM pg_class WHERE oid = %s::regclass',
+                               (table_name,))
+                table, persistence = cursor.fetchone()
+                state['tables'].append(table)
+                if unlogged and persistence == 'p':
+                    state['unlogged'].append(table)
+            if drop_foreign_keys:
+                cursor.execute(_FOREIGN_KEY_SQL, (state['tables'], state['tables']))
+                state['foreign_keys'] = cursor.fetchall()
+            if drop_indexes:
+                cursor.execute(_SECONDARY_INDEX_SQL, (state['tables'],))
+                state['indexes'] = cursor.fetchall()
+            for table, name, _, _ in state['foreign_keys']:
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+            for name, _ in state['indexes']:
+                cursor.execute(f'DROP INDEX {name}')
+            for table in state['unlogged']:
+                cursor.execute(f'ALTER TABLE {table} SET UNLOGGED')
+            cursor.close()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        for table_name in table_names:
+            self.catalog.invalidate(table_name)
+        print(f'Drop {len(state["indexes"])} indexes and {len(state["foreign_keys"])} foreign keys for bulk load '
+              f'({len(state["unlogged"])} tables set to unlogged)')
+
+        block_failed = False
+        try:
+            yield state
+        except BaseException:
+            block_failed = True
+            raise
+        finally:
+            start_time = time.perf_counter()
+            try:
+                invalid, failed = self._restore_bulk_load(state)
+            finally:
+                for table_name in table_names:
+                    self.catalog.invalidate(table_name)
+            elapsed = time.perf_counter() - start_time
+            failed_statements = {statement for statement, _ in failed}
+            n_indexes = sum(definition not in failed_statements for _, definition in state['indexes'])
+            n_foreign_keys = sum(not any(statement.startswith(f'ALTER TABLE {table} ADD CONSTRAINT {name} ')
+                                         for statement in failed_statements)
+                                 for table, name, _, _ in state['foreign_keys'])
+            print(f'Rebuild {n_indexes} indexes and {n_foreign_keys} foreign keys after bulk load ({elapsed:.1f} s)')
+            messages = []
+            if len(failed) > 0:
+                # 手動で戻せるよう、失敗したSQLのみ表示
+                print(f'Failed to restore tables after bulk load. {len(failed)} statements failed:')
+                for statement, _ in failed:
+                    print(f'{statement};')
+                statement, error = failed[0]
+                messages.append(f'{len(failed)} statements failed to restore tables after bulk load '
+                                f'(first failure: `{statement}`): {error}')
+            if len(invalid) > 0:
+                table, name, error = invalid[0]
+                messages.append(f'Foreign key {name} on table `{table}` is restored as NOT VALID because loaded rows '
+                                f'violate it ({len(invalid)} foreign keys in total): {error}')
+            if len(messages) > 0:
+                # withブロック内の例外を置き換えないよう、表示のみとする
+                if block_failed:
+                    print('\n'.join(messages))
+                else:
+                    raise Exception('\n'.join(messages))
+
+    @instrumented
     def truncate_table(self, table_name):
         """
         テーブルを空にする
@@ -309,9 +1341,13 @@ class PandaAlchemy():
             空にしたいテーブル名
         """
         sql = sqlalchemy.text(f"TRUNCATE TABLE {table_name}")
-        self.engine.execute(sql)
+        with self._connect() as conn, conn.begin():
+            conn.execute(sql)
+        self.catalog.invalidate(table_name)
+        self._invalidate_result_cache(table_name)
         print(f'Table `{table_name}` is truncated')
 
+    @instrumented
     def drop_table(self, table_name):
         """
         テーブルを削除する
@@ -322,12 +1358,17 @@ class PandaAlchemy():
             削除したいテーブル名
         """
         sql = sqlalchemy.text(f"DROP TABLE {table_name}")
-        self.engine.execute(sql)
+        with self._connect() as conn, conn.begin():
+            conn.execute(sql)
+        self.catalog.invalidate(table_name)
+        self._invalidate_result_cache(table_name)
         print(f'Table `{table_name}` is dropped')
 
     def get_table_dict(self):
         """
         テーブル一覧をdict形式で取得
+
+        DB全体をリフレクションするため、特定のテーブルのみ扱う場合は`self.catalog.get_table`を推奨
         """
         metadata = MetaData()
         metadata.reflect(self.engine)
@@ -342,14 +1383,220 @@ class PandaAlchemy():
         table_name : str
             存在有無を確認したいテーブル名
         """
-        table_dict = self.get_table_dict()
-        if table_name in table_dict.keys():
-            return True
-        else:
-            return False
+        return self.catalog.has_table(table_name)
+
+    def _make_chunk_df(self, rows, columns, index_col, parse_dates, dtype):
+        """
+        取得した行のリストをDataFrameに変換し、`pd.read_sql_query`と同様に日時型 → それ以外 → インデックスの順で型を適用
+        """
+        df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        for k in (parse_dates or []):
+            df[k] = pd.to_datetime(df[k])
+        if dtype:
+            df = df.astype(dtype)
+        if index_col is not None:
+            df = df.set_index(index_col)
+        return df
+
+    def _read_sql_query_stream(self, sql, index_col, params, parse_dates, chunksize, dtype, fetch_size):
+        """
+        サーバサイドカーソル(psycopg2の名前付きカーソル)でSQLクエリの結果を逐次取得し、chunksize行ごとにDataFrameを返すジェネレータ
 
+        クライアント側には最大chunksize行分のデータのみ保持される
+        """
+        if fetch_size is None:
+            fetch_size = chunksize
+        with self._connect() as conn:
+            # `stream_results`で名前付きカーソルを使用
+            conn = conn.execution_options(stream_results=True, max_row_buffer=fetch_size)
+            if isinstance(sql, str):
+                result = conn.exec_driver_sql(sql, params) if params is not None else conn.exec_driver_sql(sql)
+            else:
+                result = conn.execute(sql, params) if params is not None else conn.execute(sql)
+            columns = list(result.keys())
+            while True:
+                # fetch_size行ずつサーバから取得し、chunksize行たまったらDataFrame化
+                rows = []
+                while len(rows) < chunksize:
+                    fetched = result.fetchmany(min(fetch_size, chunksize - len(rows)))
+                    if not fetched:
+                        break
+                    rows.extend(fetched)
+                if not rows:
+                    break
+                df = self._make_chunk_df(rows, columns, index_col, parse_dates, dtype)
+                del rows
+                yield df
+            result.close()
+
+    def _compile_statement(self, sql, params):
+        """
+        SQL(生SQL、SQL Expression Language、ORM)を、psycopg2形式のSQL文字列とパラメータに変換
+        """
+        # 生SQLのときはそのまま
+        if isinstance(sql, str):
+            return sql, params
+        # SQL Expression Language, ORM構文のとき、コンパイルしてバインドパラメータとparamsを統合
+        compiled = sql.compile(dialect=self.engine.dialect, compile_kwargs={'render_postcompile': True})
+        compiled_params = dict(compiled.params)
+        if params is not None:
+            compiled_params.update(params)
+        return str(compiled), compiled_params
+
+    def _compile_sql(self, cursor, sql, params):
+        """
+        SQL(生SQL、SQL Expression Language、ORM)を、パラメータを埋め込んだSQL文字列に変換
+
+        `COPY (...) TO STDOUT`等、パラメータを別途渡せない構文で使用する(埋め込みはpsycopg2の`mogrify`でエスケープ)
+        """
+        sql_text, params = self._compile_statement(sql, params)
+        query = sql_text if params is None else cursor.mogrify(sql_text, params)
+        if isinstance(query, bytes):
+            query = query.decode('utf-8')
+        # サブクエリとして埋め込めるよう末尾のセミコロンを除去
+        return query.strip().rstrip(';')
+
+    def _copy_query_to_buffer(self, sql, params):
+        """
+        `COPY (...) TO STDOUT`(CSV形式, ヘッダあり, NULLは"\\N")でSQLクエリの結果を受信し、(受信データ, 結果の列情報)を返す
+
+        受信データは`COPY_SPOOL_SIZE`バイトまでメモリに保持し、超えた分は一時ファイルに退避する(先頭にシーク済)。
+        結果の列情報はpsycopg2の`cursor.description`(各列の`name`, `type_code`(OID))
+        """
+        buf = tempfile.SpooledTemporaryFile(max_size=self.COPY_SPOOL_SIZE, mode='w+b')
+        conn = self._raw_connection()
+        try:
+            cursor = conn.cursor()
+            query = self._compile_sql(cursor, sql, params)
+            # 結果の列の型(OID)を取得
+            cursor.execute(f'SELECT * FROM ({query}) AS _pdalchemy_query LIMIT 0')
+            description = cursor.description
+            # タイムゾーン付き日時は`pd.read_sql_query`と同様にUTCで取得
+            cursor.execute("SET LOCAL TIME ZONE 'UTC'")
+            with self.metrics.phase('db_time'):
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')", buf)
+            self.metrics.add('bytes', buf.tell())
+            cursor.close()
+            conn.rollback()  # 読込のみのため、トランザクションは破棄
+        except Exception:
+            buf.close()
+            raise
+        finally:
+            conn.close()
+        buf.seek(0)
+        return buf, description
+
+    def _read_sql_query_copy(self, sql, index_col, params, parse_dates, chunksize, dtype):
+        """
+        `COPY (...) TO STDOUT`(CSV形式)でSQLクエリの結果を取得し、`pandas.read_csv`(C実装のパーサ)でDataFrameに変換
+        """
+        buf, description = self._copy_query_to_buffer(sql, params)
+        # 結果の列の型(OID)から、型が指定されていない列の読込方法を決定
+        dtype = dict(dtype) if dtype is not None else {}
+        parse_dates = list(parse_dates) if parse_dates is not None else []
+        na_values = {}
+        for column in description:
+            # NULLは"\\N"で出力される(浮動小数点型は"NaN"も欠損値とする)
+            na_values[column.name] = ['\\N', 'NaN'] if column.type_code in POSTGRES_FLOAT_OIDS else ['\\N']
+            if column.name in dtype or column.name in parse_dates:
+                continue
+            # 文字列型は数値と解釈されないよう文字列のまま読込
+            if column.type_code in POSTGRES_STRING_OIDS:
+                dtype[column.name] = 'object'
+            # 日時型は日時として読込
+            elif column.type_code in POSTGRES_DATETIME_OIDS:
+                parse_dates.append(column.name)
+        # 拡張型(Int64等)と日時型はパーサで直接変換すると遅いため、読込後に列単位で変換
+        dtype_csv = {k: v for k, v in dtype.items()
+                     if not pd.api.types.is_extension_array_dtype(pd.api.types.pandas_dtype(v))}
+        dtype_after = {k: v for k, v in dtype.items() if k not in dtype_csv}
+
+        type_codes = {column.name: column.type_code for column in description}
+
+        def convert(df):
+            for k in parse_dates:
+                df[k] = parse_copy_datetime(df[k], type_codes.get(k))
+            if dtype_after:
+                df = df.astype(dtype_after)
+            if index_col is not None:
+                df = df.set_index(index_col)
+            return df
+
+        # `COPY`のCSV出力をDataFrameに変換(真偽値は"t", "f"で出力される)
+        reader = pd.read_csv(buf, dtype=dtype_csv, chunksize=chunksize, na_values=na_values,
+                             keep_default_na=False, true_values=['t'], false_values=['f'])
+        if chunksize is None:
+            return convert(reader)
+        return (convert(df) for df in reader)
+
+    def _read_arrow_table(self, sql, params, dtype_dict, parse_dates, dictionary_columns):
+        """
+        `COPY (...) TO STDOUT`(CSV形式)でSQLクエリの結果を取得し、`pyarrow.csv`(C++実装のパーサ)で直接Arrow形式の列に変換
+
+        列の型は`dtype_dict` → `parse_dates` → DBの列の型(OID)の優先順位で決定する
+        """
+        _check_pyarrow()
+        buf, description = self._copy_query_to_buffer(sql, params)
+        try:
+            column_types = make_arrow_column_types([(column.name, column.type_code) for column in description],
+                                                   dtype_dict=dtype_dict, parse_dates=parse_dates,
+                                                   dictionary_columns=dictionary_columns)
+            with self.metrics.phase('conversion_time'):
+                return read_copy_csv(buf, column_types)
+        finally:
+            buf.close()
+
+    def _get_auto_dtype_plan(self, sql, params, dtype_dict, parse_dates):
+        """
+        DBの列の型と統計情報(`self.catalog`にキャッシュ)から、型指定のない列の変換後の型をdictで作成
+        """
+        sql_text, compiled_params = self._compile_statement(sql, params)
+        skip = set(dtype_dict or []) | set(parse_dates or [])
+        plan = {}
+        for column in self.catalog.get_query_columns(sql_text, compiled_params):
+            name, oid, nullable = column['name'], column['type_code'], column['nullable']
+            if name in skip:
+                continue
+            # 整数型は桁数に合わせた型(NULLを含み得る列はNULL許容型)
+            if oid in (21, 23, 20):
+                dtype = {21: 'int16', 23: 'int32', 20: 'int64'}[oid]
+                plan[name] = dtype.capitalize() if nullable else dtype
+            elif oid == 16:
+                plan[name] = 'boolean' if nullable else 'bool'
+            elif oid == 700:
+                plan[name] = 'float32'
+            elif oid == 701:
+                plan[name] = 'float64'
+            # 値の種類が少ない文字列型の列はcategory型
+            elif oid in (25, 1042, 1043) and column['n_distinct'] is not None \
+                    and column['n_distinct'] <= self.AUTO_CATEGORY_MAX_DISTINCT \
+                    and (column['rows'] is None or column['n_distinct'] <= column['rows'] * self.AUTO_CATEGORY_MAX_RATIO):
+                plan[name] = 'category'
+        return plan
+
+    def _apply_auto_dtypes(self, df, plan, index_col):
+        """
+        `_get_auto_dtype_plan`で作成した型にDataFrameを変換し、インデックスを設定
+
+        NOT NULL制約のある列でも外部結合等でNULLを含む場合は、NULL許容型に変換する
+        """
+        with self.metrics.phase('conversion_time'):
+            for k, dtype in plan.items():
+                if k not in df.columns:
+                    continue
+                if dtype in ('int16', 'int32', 'int64', 'bool') and df[k].isna().any():
+                    dtype = 'boolean' if dtype == 'bool' else dtype.capitalize()
+                if df[k].dtype != dtype:
+                    df[k] = df[k].astype(dtype)
+        if index_col is not None:
+            df = df.set_index(index_col)
+        return df
+
+    @instrumented
     def read_sql_query(self, sql, index_col=None, params=None,
-                       parse_dates=None, chunksize=None, dtype_dict=None):
+                       parse_dates=None, chunksize=None, dtype_dict=None,
+                       stream=False, fetch_size=None, method=None, use_cache=True,
+                       dtype_backend=None, dictionary_columns=None, auto_dtypes=False):
         """
         SQLクエリで取得した内容をpandas.DataFrameに出力
 
@@ -402,12 +1649,551 @@ class PandaAlchemy():
             記載例: 
 
             >>> dtype_dict={"column1": "Float", "column2":"String", "column3": sqlalchemy.types.Date()} 
+
+        stream : bool, default=False
+            Trueなら、サーバサイドカーソルで結果を逐次取得し、chunksize行ごとにDataFrameを返すジェネレータを返す(`chunksize`の指定が必要)
+
+            Falseの場合は`chunksize`を指定しても全結果が一旦クライアントのメモリに読み込まれるため、巨大な結果を扱う際はTrueを推奨
+
+        fetch_size : int, default=None
+            `stream=True`の時、サーバから1回に取得する行数(Noneならchunksizeと同じ)
+
+        method : {None, "copy"}, default=None
+            データ取得方法
+
+            None: `pandas.read_sql_query`で取得
+
+            "copy": PostgreSQLの`COPY (...) TO STDOUT`でCSV形式の結果を一括受信し、`pandas.read_csv`で型を指定して変換(大量データ向け)。`params`は`sql`に埋め込んで実行
+
+        use_cache : bool, default=True
+            `result_cache`が設定されているとき、結果キャッシュを使用するか(`chunksize`指定時は使用しない)
+
+            ビュー、関数のみを参照するクエリ等、参照しているテーブルを特定できないクエリの結果はキャッシュしない
+
+        dtype_backend : {None, "pyarrow"}, default=None
+            DataFrameの列の保持形式
+
+            None: NumPyの型(文字列型はPythonのオブジェクト)
+
+            "pyarrow": Arrowの型(`string[pyarrow]`, `int32[pyarrow]`等)。`COPY (...) TO STDOUT`の出力を`pyarrow.csv`で直接Arrow形式に変換する。
+            文字列型の列のメモリ使用量が大幅に減り、整数・真偽値型の列は欠損値を含んでも浮動小数点型にならない(PyArrowが必要。`chunksize`, `stream`, `method`は使用不可)
+
+        dictionary_columns : list[str], default=None
+            `dtype_backend="pyarrow"`の時、辞書エンコードする文字列型の列(値の種類が少ない列向け。category型で出力)
+
+        auto_dtypes : bool, default=False
+            Trueなら、`dtype_dict`, `parse_dates`で指定していない列の型を、DBの列の型と統計情報から自動で決定(PostgreSQLのみ)
+
+            SMALLINT, INTEGER, BIGINTはint16, int32, int64(NOT NULL制約がない列はInt16等のNULL許容型)、REALはfloat32、
+            値の種類が少ない文字列型の列(`pg_stats`の推定値が`AUTO_CATEGORY_MAX_DISTINCT`以下)はcategory型とする。
+            DBの列の情報は`self.catalog`にキャッシュされる(`dtype_backend="pyarrow"`の時は、値の種類が少ない文字列型の列を辞書エンコード)
         """
+        # 結果キャッシュが有効なとき、キャッシュから取得(参照している全てがテーブルと判定できるクエリのみ)
+        use_result_cache = self.result_cache is not None and use_cache and chunksize is None
+        if use_result_cache:
+            cache_tables = self._get_result_cache_tables(sql)
+            use_result_cache = cache_tables is not None
+        if use_result_cache:
+            sql_text, cache_params = self._compile_statement(sql, params)
+            cache_key = self.result_cache.make_key(sql_text, cache_params, dtype_dict, index_col=index_col,
+                                                   parse_dates=parse_dates, method=method, dtype_backend=dtype_backend,
+                                                   dictionary_columns=dictionary_columns, auto_dtypes=auto_dtypes)
+            df = self.result_cache.get(cache_key)
+            if df is not None:
+                return df
         # dtype_dictが指定されているとき、日時型とそれ以外に分ける
         if dtype_dict is not None:
             dtype_except_dt, parse_dates = self._make_pandas_dtype(dtype_dict)
         else:
             dtype_except_dt = None
-        df = pd.read_sql_query(sql=sql, con=self.engine, index_col=index_col, params=params, 
-                               parse_dates=parse_dates, chunksize=chunksize, dtype=dtype_except_dt)
-        return df
\ No newline at end of file
+        # 型を自動で決定するとき、型指定のない列の変換内容を作成(インデックスは型変換後に設定)
+        auto_plan = None
+        if auto_dtypes:
+            auto_plan = self._get_auto_dtype_plan(sql, params, dtype_dict, parse_dates)
+            if dtype_backend == 'pyarrow':
+                dictionary_columns = list(dictionary_columns or []) + [k for k, v in auto_plan.items() if v == 'category']
+                auto_plan = None
+            else:
+                auto_index_col, index_col = index_col, None
+        # Arrow形式で取得
+        if dtype_backend == 'pyarrow':
+            if stream or chunksize is not None or method is not None:
+                raise Exception('`chunksize`, `stream` and `method` are not available when `dtype_backend` is "pyarrow".')
+            df = arrow_table_to_pandas(self._read_arrow_table(sql, params, dtype_dict, parse_dates, dictionary_columns))
+            if index_col is not None:
+                df = df.set_index(index_col)
+        elif dtype_backend is not None:
+            raise Exception(f'`dtype_backend` should be None or "pyarrow", but {dtype_backend} is specified.')
+        # `COPY (...) TO STDOUT`で一括取得
+        elif method == 'copy':
+            if stream:
+                raise Exception('`stream` is not available when `method` is "copy".')
+            df = self._read_sql_query_copy(sql, index_col, params, parse_dates, chunksize, dtype_except_dt)
+        elif method is not None:
+            raise Exception(f'`method` should be None or "copy", but {method} is specified.')
+        # サーバサイドカーソルで逐次取得
+        elif stream:
+            if chunksize is None:
+                raise Exception('`chunksize` should be specified when `stream` is True.')
+            df = self._read_sql_query_stream(sql, index_col, params, parse_dates, chunksize,
+                                             dtype_except_dt, fetch_size)
+        elif chunksize is None:
+            with self._connect() as conn:
+                df = pd.read_sql_query(sql=sql, con=conn, index_col=index_col, params=params, 
+                                       parse_dates=parse_dates, dtype=dtype_except_dt)
+        else:
+            df = pd.read_sql_query(sql=sql, con=self.engine, index_col=index_col, params=params, 
+                                   parse_dates=parse_dates, chunksize=chunksize, dtype=dtype_except_dt)
+        # 自動で決定した型に変換
+        if auto_plan is not None:
+            if isinstance(df, pd.DataFrame):
+                df = self._apply_auto_dtypes(df, auto_plan, auto_index_col)
+            else:
+                df = (self._apply_auto_dtypes(chunk, auto_plan, auto_index_col) for chunk in df)
+        if isinstance(df, pd.DataFrame):
+            self.metrics.add('rows', len(df))
+        # 結果キャッシュに保存
+        if use_result_cache:
+            self.result_cache.put(cache_key, df, cache_tables)
+        return df
+
+    @instrumented
+    def read_arrow_table(self, sql, params=None, dtype_dict=None, parse_dates=None, dictionary_columns=None):
+        """
+        SQLクエリで取得した内容をpyarrow.Tableに出力
+
+        pandasを経由しないため、ParquetファイルやPolars等へ変換せずに受け渡せる(PyArrowが必要)
+
+        Parameters
+        ----------
+        sql : str
+            適用するSQL文(`read_sql_query`と同様)
+
+        params : list, tuple or dict, default=None
+            SQL文のプレースホルダに渡す値(`sql`に埋め込んで実行)
+
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`read_sql_query`と同様。指定のない列はDBの列の型に対応するArrowの型)
+
+        parse_dates : list[str], default=None
+            日時型として読み込みたいフィールド名のリスト
+
+        dictionary_columns : list[str], default=None
+            辞書エンコードする文字列型の列
+        """
+        table = self._read_arrow_table(sql, params, dtype_dict, parse_dates, dictionary_columns)
+        self.metrics.add('rows', table.num_rows)
+        return table
+
+    def table(self, table_name, schema=None):
+        """
+        テーブルを遅延評価の`LazyFrame`として取得
+
+        列の選択、フィルタ、`groupby().agg`、`head`、`sort_values`はSQLとしてDB側で処理し、
+        `collect()`(または`to_pandas()`)の呼出時に`read_sql_query`で結果のみを取得する。列の型はテーブルの列の型から決定する
+
+        記載例:
+
+        >>> iris = pdalchemy.table('iris')
+        >>> df = iris[iris['species'] == 'setosa'].groupby('species').agg({'sepal_length': 'mean'}).collect()
+
+        Parameters
+        ----------
+        table_name : str
+            テーブル名
+
+        schema : str, default=None
+            スキーマ名(Noneならデフォルトのスキーマ)
+        """
+        table = self.catalog.get_table(table_name, schema=schema)
+        dtype_dict = {}
+        for column in table.columns:
+            dtype = _dtype_from_type(column.type, nullable=column.nullable)
+            if dtype is not None:
+                dtype_dict[column.name] = dtype
+        return LazyFrame(self, sqlalchemy.select(table), dtype_dict)
+
+    def _iter_background(self, iterator, max_prefetch):
+        """
+        イテレータの要素を別スレッドで取り出し、最大`max_prefetch`個まで先読みして返すジェネレータ
+        """
+        items = queue.Queue(maxsize=max_prefetch)
+        stop = threading.Event()
+        end = object()
+
+        def produce():
+            try:
+                for item in iterator:
+                    while not stop.is_set():
+                        try:
+                            items.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+                items.put(end)
+            except Exception as e:
+                items.put(e)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = items.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 呼出元が途中で終了した場合も、先読みのスレッドを停止
+            stop.set()
+            thread.join()
+
+    @instrumented
+    def export_query(self, sql, path, params=None, dtype_dict=None, parse_dates=None, partition_by=None,
+                     rows_per_file=None, block_size=None, background=False, existing_data_behavior='error'):
+        """
+        SQLクエリの結果を、pandasを経由せずにパーティション分割したParquetのデータセットとして出力
+
+        `COPY (...) TO STDOUT`(CSV形式)の出力をパイプ経由で`block_size`バイトずつArrowのRecordBatchに変換しながら書き込むため、
+        結果の行数によらずメモリ使用量は一定(PyArrowが必要)
+
+        記載例:
+
+        >>> pdalchemy.export_query('SELECT * FROM sales', './sales', partition_by=['region'], rows_per_file=10000000)
+
+        Parameters
+        ----------
+        sql : str
+            適用するSQL文(`read_sql_query`と同様)
+
+        path : str
+            出力先のディレクトリ
+
+        params : list, tuple or dict, default=None
+            SQL文のプレースホルダに渡す値(`sql`に埋め込んで実行)
+
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`read_arrow_table`と同様)
+
+        parse_dates : list[str], default=None
+            日時型として読み込みたいフィールド名のリスト
+
+        partition_by : str or list[str], default=None
+            パーティション分割に使用する列名(Hive形式の"列名=値"のディレクトリに分割。Noneなら分割しない)
+
+        rows_per_file : int, default=None
+            1ファイルの最大行数(Noneなら上限なし)
+
+        block_size : int, default=None
+            1回に変換するCSVのバイト数(Noneなら`EXPORT_BLOCK_SIZE`)
+
+        background : bool, default=False
+            Trueなら、CSVからArrowへの変換を別スレッドで行い、Parquetの書込と並行して実行
+
+        existing_data_behavior : {"error", "overwrite_or_ignore", "delete_matching"}, default="error"
+            出力先に既存のファイルがある場合の動作(`pyarrow.dataset.write_dataset`と同様)
+
+        Returns
+        ----------
+        dict
+            処理結果
+
+            "records": 出力した行数, "bytes": 受信したバイト数, "files": 作成したファイルのパスのリスト, "seconds": 処理時間(秒),
+            "records_per_sec": 処理速度(行/秒)
+        """
+        _check_pyarrow()
+        start_time = time.perf_counter()
+        if isinstance(partition_by, str):
+            partition_by = [partition_by]
+        if block_size is None:
+            block_size = self.EXPORT_BLOCK_SIZE
+        conn = self._raw_connection()
+        read_fd, write_fd = os.pipe()
+        reader = os.fdopen(read_fd, 'rb')
+        writer = os.fdopen(write_fd, 'wb')
+        copy_errors = []
+        aborted = threading.Event()  # 書込側の失敗で中断したか(中断後のパイプの切断は`COPY`の失敗として扱わない)
+        record = self.metrics.current  # 受信スレッドの計測値を本操作の記録に加算
+
+        def copy_to_pipe(cursor, copy_sql):
+            """`COPY`の出力をパイプに書込(書込側を閉じると読込側で終端となる)"""
+            try:
+                with self.metrics.attach(record), self.metrics.phase('db_time'):
+                    cursor.copy_expert(copy_sql, writer)
+            except Exception as e:
+                if not aborted.is_set():
+                    copy_errors.append(e)
+            finally:
+                try:
+                    writer.close()
+                except OSError:
+                    pass
+
+        thread = None
+        counted = _CountingReader(reader)
+        try:
+            cursor = conn.cursor()
+            query = self._compile_sql(cursor, sql, params)
+            # 結果の列の型(OID)を取得し、Arrowの型を決定(ブロックごとの推定で型が変わらないよう、不明な型は文字列とする)
+            cursor.execute(f'SELECT * FROM ({query}) AS _pdalchemy_query LIMIT 0')
+            columns = [(column.name, column.type_code) for column in cursor.description]
+            column_types = make_arrow_column_types(columns, dtype_dict, parse_dates)
+            column_types = {name: column_types.get(name, pa.string()) for name, _ in columns}
+            # タイムゾーン付き日時は`read_sql_query`と同様にUTCで取得
+            cursor.execute("SET LOCAL TIME ZONE 'UTC'")
+            thread = threading.Thread(target=copy_to_pipe, daemon=True, args=(
+                cursor, f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')"))
+            thread.start()
+            csv_reader = open_copy_csv(counted, column_types, block_size=block_size)
+            n_records = [0]
+
+            def iter_batches():
+                for batch in csv_reader:
+                    n_records[0] += batch.num_rows
+                    yield batch
+
+            batches = self._iter_background(iter_batches(), 2) if background else iter_batches()
+            files = write_parquet_dataset(batches, csv_reader.schema, path, partition_by=partition_by,
+                                          rows_per_file=rows_per_file,
+                                          existing_data_behavior=existing_data_behavior)
+            thread.join()
+            if copy_errors:
+                raise copy_errors[0]
+            cursor.close()
+            conn.rollback()  # 読込のみのため、トランザクションは破棄
+        except Exception as e:
+            # 読込側を閉じて受信スレッドを終了させ、`COPY`途中のコネクションはプールに戻さず破棄
+            aborted.set()
+            reader.close()
+            if thread is not None:
+                thread.join()
+            conn.invalidate()
+            # `COPY`自体の失敗(SQLの誤り等)を優先して返す
+            if copy_errors and copy_errors[0] is not e:
+                raise copy_errors[0] from e
+            raise
+        finally:
+            reader.close()
+            conn.close()
+        self.metrics.add('bytes', counted.n_bytes)
+        self.metrics.add('rows', n_records[0])
+
+        elapsed = time.perf_counter() - start_time
+        report = {'records': n_records[0], 'bytes': counted.n_bytes, 'files': files, 'seconds': elapsed,
+                  'records_per_sec': n_records[0] / max(elapsed, 1e-9)}
+        print(f'Export {report["records"]} records to {len(files)} files in `{path}` ({report["records_per_sec"]:.0f} records/s)')
+        return report
+
+    def _make_subquery(self, sql_or_table, name):
+        """
+        テーブル名、SQL文、SQL Expression Language構文を、条件を追加できるサブクエリに変換
+        """
+        if isinstance(sql_or_table, str) and re.fullmatch(r'[\w.]+', sql_or_table):
+            *schema, table_name = sql_or_table.split('.')
+            source = sqlalchemy.select(sqlalchemy.text('*')).select_from(
+                sqlalchemy.table(table_name, schema=schema[0] if schema else None))
+        elif isinstance(sql_or_table, sqlalchemy.sql.expression.TableClause):
+            source = sqlalchemy.select(sqlalchemy.text('*')).select_from(sql_or_table)
+        elif isinstance(sql_or_table, str):
+            source = sqlalchemy.text(sql_or_table)
+        else:
+            source = sql_or_table
+        if isinstance(source, sqlalchemy.sql.expression.TextClause):
+            source = source.columns()
+        return source.subquery(name)
+
+    def _make_partition_queries(self, sql_or_table, partition_column, num_partitions, params,
+                                lower_bound, upper_bound):
+        """
+        パーティション列の値の範囲を分割し、各パーティションを読み込むSQL文字列とパラメータのリストを作成
+        """
+        subquery = self._make_subquery(sql_or_table, '_pdalchemy_partition')
+        column = sqlalchemy.column(partition_column)
+        # 分割範囲の指定がないとき、パーティション列の最小値と最大値を取得
+        if lower_bound is None or upper_bound is None:
+            bound_query = sqlalchemy.select(sqlalchemy.func.min(column), sqlalchemy.func.max(column)).select_from(subquery)
+            with self._connect() as conn:
+                min_value, max_value = conn.execute(bound_query, params or {}).one()
+            lower_bound = min_value if lower_bound is None else lower_bound
+            upper_bound = max_value if upper_bound is None else upper_bound
+        # 境界値を作成(整数は整数除算、浮動小数点・日時は按分)
+        if lower_bound is None or upper_bound is None or num_partitions <= 1:
+            bounds = []
+        elif isinstance(lower_bound, int) and isinstance(upper_bound, int):
+            bounds = [lower_bound + (upper_bound - lower_bound) * i // num_partitions for i in range(1, num_partitions)]
+        else:
+            bounds = [lower_bound + (upper_bound - lower_bound) * i / num_partitions for i in range(1, num_partitions)]
+        bounds = sorted(set(bounds))
+        # 境界値で区切った条件を作成(範囲外の値とNULLは先頭・末尾のパーティションに含める)
+        if len(bounds) == 0:
+            conditions = [sqlalchemy.true()]
+        else:
+            conditions = [sqlalchemy.or_(column < bounds[0], column.is_(None))]
+            conditions += [sqlalchemy.and_(column >= lo, column < hi) for lo, hi in zip(bounds[:-1], bounds[1:])]
+            conditions.append(column >= bounds[-1])
+        # SQL文字列とパラメータにコンパイル
+        queries = []
+        for condition in conditions:
+            statement = sqlalchemy.select(sqlalchemy.text('*')).select_from(subquery).where(condition)
+            compiled = statement.compile(dialect=self.engine.dialect, compile_kwargs={'render_postcompile': True})
+            query_params = dict(compiled.params)
+            if params is not None:
+                query_params.update(params)
+            queries.append((str(compiled), query_params))
+        return queries
+
+    @instrumented
+    def read_partitioned(self, sql_or_table, partition_column, num_partitions, index_col=None, params=None,
+                         dtype_dict=None, lower_bound=None, upper_bound=None, max_workers=None,
+                         executor='thread', method=None):
+        """
+        パーティション列の値の範囲で分割したクエリを並列実行し、結果を結合したpandas.DataFrameを出力
+
+        各パーティションは`read_sql_query`で読み込む(スレッド並列時は`self.engine`のコネクションプールを共有)
+
+        Parameters
+        ----------
+        sql_or_table : str, sqlalchemy.Table or SQL Expression Language構文
+            読込対象のテーブル名、またはSQL文(生SQLの場合、プレースホルダは`:name`形式で指定)
+
+        partition_column : str
+            分割に使用する列名(インデックスの張られた整数型または日時型の列を推奨)
+
+        num_partitions : int
+            分割数
+
+        index_col : str or list[str], default=None
+            インデックスとして適用するフィールド名(リスト指定した場合MultiIndexとなる)
+
+        params : dict, default=None
+            SQL文のプレースホルダに渡す値
+
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`read_sql_query`と同様)
+
+        lower_bound : int, float or datetime, default=None
+            分割範囲の下限(Noneならパーティション列の最小値。範囲外の値も先頭のパーティションで読み込まれる)
+
+        upper_bound : int, float or datetime, default=None
+            分割範囲の上限(Noneならパーティション列の最大値。範囲外の値も末尾のパーティションで読み込まれる)
+
+        max_workers : int, default=None
+            並列数(Noneなら`num_partitions`と同じ。ただし"thread"ではコネクションプールの上限(`pool_size` + `max_overflow`)まで)
+
+            "thread"で指定する場合、コネクションプールの上限を`max_workers`以上とする必要がある
+            (不足するとプールの待ち時間が`pool_timeout`を超えてエラーとなる)
+
+        executor : {"thread", "process"}, default="thread"
+            並列化の方法
+
+            "thread": スレッド並列(`self.engine`のコネクションプールを共有)
+
+            "process": プロセス並列(各プロセスで新たにengineを作成。DataFrameへの変換処理が重い場合向け)
+
+        method : {None, "copy"}, default=None
+            各パーティションのデータ取得方法(`read_sql_query`と同様)
+        """
+        queries = self._make_partition_queries(sql_or_table, partition_column, num_partitions, params,
+                                               lower_bound, upper_bound)
+        if max_workers is None:
+            max_workers = len(queries)
+            # スレッド並列はコネクションプールを共有するため、プールの上限を超えない並列数とする
+            if executor == 'thread':
+                pool_limit = self._pool_limit()
+                if pool_limit is not None:
+                    max_workers = max(1, min(max_workers, pool_limit))
+        # パーティションごとに並列で読込(スレッド並列は、各スレッドの計測値(行数等)を本操作の記録に加算)
+        if executor == 'thread':
+            record = self.metrics.current
+
+            def read_one(sql, query_params):
+                with self.metrics.attach(record):
+                    return self.read_sql_query(sql, index_col=index_col, params=query_params,
+                                               dtype_dict=dtype_dict, method=method)
+
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(read_one, sql, query_params) for sql, query_params in queries]
+                dfs = [future.result() for future in futures]
+        elif executor == 'process':
+            connection_args = (self.username, self.password, self.host, self.port, self.database)
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(_read_partition, connection_args, sql, query_params,
+                                       index_col, dtype_dict, method)
+                           for sql, query_params in queries]
+                dfs = [future.result() for future in futures]
+            # 別プロセスでの読込は計測されないため、行数のみ加算
+            self.metrics.add('rows', sum(len(df) for df in dfs))
+        else:
+            raise Exception(f'`executor` should be "thread" or "process", but {executor} is specified.')
+        # パーティション列の順に結合(空のパーティションは列の型が定まらないため除外)
+        dfs = [df for df in dfs if len(df) > 0] or dfs[:1]
+        return pd.concat(dfs, ignore_index=index_col is None)
+
+    @instrumented
+    def sync_query(self, snapshot, sql_or_table, watermark_column, key_columns=None, lookback=None,
+                   params=None, dtype_dict=None, method=None):
+        """
+        前回取得以降に追加された行のみをDBから取得し、ローカルのスナップショット(Parquetファイル)に追加して、全体をpandas.DataFrameで出力
+
+        ウォーターマーク列(連番の主キーや登録日時等、行の追加に伴い増加する列)の取得済の最大値より大きい行のみを取得するため、
+        テーブル全体ではなく差分のみが転送される(初回は全件取得)。DB側で削除された行はスナップショットに反映されない
+
+        記載例:
+
+        >>> snapshot = IncrementalSnapshot('./snapshots/iris')
+        >>> df = pdalchemy.sync_query(snapshot, 'iris', 'id')
+
+        Parameters
+        ----------
+        snapshot : panda_alchemy.IncrementalSnapshot
+            取得結果を蓄積するスナップショット(テーブル・クエリごとに別のディレクトリを使用)
+
+        sql_or_table : str, sqlalchemy.Table or SQL Expression Language構文
+            取得対象のテーブル名、またはSQL文(生SQLの場合、プレースホルダは`:name`形式で指定)
+
+        watermark_column : str
+            ウォーターマーク列の名前(整数型または日時型)
+
+        key_columns : str or list[str], default=None
+            行の一致判定に使用する列名(指定時は、キーが既存の行と一致した取得行で置き換える。`lookback`指定時は必須)
+
+        lookback : int, float or datetime.timedelta, default=None
+            ウォーターマークから遡って再取得する範囲(例: `datetime.timedelta(minutes=10)`)
+
+            更新日時の列をウォーターマークとし、コミットの遅延等で取得済の最大値より前の値の行が後から追加・更新され得る場合に指定
+
+        params : dict, default=None
+            SQL文のプレースホルダに渡す値
+
+        dtype_dict : dict[str, str], default=None
+            列名と型の組み合わせを指定するdict(`read_sql_query`と同様。回ごとに型が変わらないよう指定を推奨)
+
+        method : {None, "copy"}, default=None
+            データ取得方法(`read_sql_query`と同様)
+        """
+        if isinstance(key_columns, str):
+            key_columns = [key_columns]
+        if lookback is not None and key_columns is None:
+            raise Exception('`key_columns` should be specified when `lookback` is specified.')
+        # 取得元のクエリを作成し、スナップショットの取得元と一致するか確認
+        subquery = self._make_subquery(sql_or_table, '_pdalchemy_sync')
+        statement = sqlalchemy.select(sqlalchemy.text('*')).select_from(subquery)
+        source_text = str(statement.compile(dialect=self.engine.dialect))
+        snapshot.check_source(source_text, watermark_column)
+        # 取得済のウォーターマークより後の行のみ取得
+        watermark = snapshot.watermark
+        if watermark is not None:
+            lower = watermark - lookback if lookback is not None else watermark
+            statement = statement.where(sqlalchemy.column(watermark_column) > lower)
+        delta = self.read_sql_query(statement, params=params, dtype_dict=dtype_dict, method=method, use_cache=False)
+        # ウォーターマークを更新し、スナップショットに追加
+        if len(delta) > 0 and delta[watermark_column].notna().any():
+            delta_max = delta[watermark_column].max()
+            watermark = delta_max if watermark is None else max(watermark, delta_max)
+        df = snapshot.append(delta, watermark, key_columns=key_columns)
+
+        print(f'Sync {len(delta)} records into snapshot `{snapshot.snapshot_dir}` (total {len(df)} records)')
+        return df
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+# バイナリCOPYのヘッダ(シグネチャ + フラグ + ヘッダ拡張長)とトレーラ
+BINARY_COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00'
+BINARY_COPY_TRAILER = b'\xff\xff'
+# PostgreSQLの日時型の基準日(2000-01-01)
+POSTGRES_EPOCH = np.datetime64('2000-01-01T00:00:00', 'us')
+
+# 文字列として扱う型のOID(char, name, text, bpchar, varchar, json, jsonb, uuid)
+POSTGRES_STRING_OIDS = {18, 19, 25, 1042, 1043, 114, 3802, 2950}
+# 浮動小数点型のOID(real, double precision)
+POSTGRES_FLOAT_OIDS = {700, 701}
+# 日時として扱う型のOID(date, timestamp, timestamptz)
+POSTGRES_DATETIME_OIDS = {1082, 1114, 1184}
+# タイムゾーン付きの日時型(timestamptz)のOID
+POSTGRES_TIMESTAMPTZ_OID = 1184
+# pandas 2.0以降は、`pandas.to_datetime`で行ごとに書式が異なるISO 8601の文字列を変換するには`format="ISO8601"`の指定が必要
+_ISO8601_FORMAT = {'format': 'ISO8601'} if int(pd.__version__.split('.')[0]) >= 2 else {}
+
+# 固定長の型のバイナリ表現(ビッグエンディアン)
+_FIXED_WIDTH_FORMATS = {
+    'float4': '>f4',
+    'float8': '>f8',
+    'int2': '>i2',
+    'int4': '>i4',
+    'int8': '>i8',
+    'bool': 'u1',
+    'timestamp': '>i8',
+    'timestamptz': '>i8',
+    'date': '>i4',
+}
+
+
+def parse_copy_datetime(values, type_code=None):
+    """
+    `COPY ... TO STDOUT`のテキスト出力の日時の文字列を日時型に変換
+
+    PostgreSQLは小数秒が0の場合は小数部を省略し、timestamptzは行ごとにUTCオフセットが異なり得るため、ISO 8601として行ごとに変換する。
+    timestamptz(`type_code`が1184)の列はUTCのタイムゾーン付きの日時とする
+
+    Parameters
+    ----------
+    values : pandas.Series
+        日時の文字列の列
+
+    type_code : int, default=None
+        列の型のOID
+    """
+    return pd.to_datetime(values, utc=type_code == POSTGRES_TIMESTAMPTZ_OID, **_ISO8601_FORMAT)
+
+
+def _get_binary_format(sqlalchemy_type):
+    """
+    `sqlalchemy.types`の型からバイナリCOPYでの表現形式を取得
+    """
+    if isinstance(sqlalchemy_type, sqlalchemy.types.Boolean):
+        return 'bool'
+    # FloatはNumericのサブクラスのため先に判定(REALおよび精度24以下は単精度)
+    elif isinstance(sqlalchemy_type, sqlalchemy.types.Float):
+        if isinstance(sqlalchemy_type, sqlalchemy.types.REAL) \
+                or (sqlalchemy_type.precision is not None and sqlalchemy_type.precision <= 24):
+            return 'float4'
+        return 'float8'
+    elif isinstance(sqlalchemy_type, sqlalchemy.types.BigInteger):
+        return 'int8'
+    elif isinstance(sqlalchemy_type, sqlalchemy.types.SmallInteger):
+        return 'int2'
+    elif isinstance(sqlalchemy_type, sqlalchemy.types.Integer):
+        return 'int4'
+    elif isinstance(sqlalchemy_type, sqlalchemy.types.DateTime):
+        return 'timestamptz' if sqlalchemy_type.timezone else 'timestamp'
+    elif isinstance(sqlalchemy_type, sqlalchemy.types.Date):
+        return 'date'
+    elif isinstance(sqlalchemy_type, sqlalchemy.types.String):
+        return 'text'
+    else:
+        raise Exception(f'Binary COPY does not support column type {sqlalchemy_type}. Use `method="copy"` instead.')
+
+
+def _needs_session_timezone(series, sqlalchemy_type):
+    """
+    タイムゾーンなしの日時をtimestamptzの列に転送するか(DBのセッションのタイムゾーンで解釈する必要があり、バイナリCOPYでは転送できない)
+    """
+    return isinstance(sqlalchemy_type, sqlalchemy.types.DateTime) and bool(sqlalchemy_type.timezone) \
+        and not isinstance(series.dtype, pd.DatetimeTZDtype) and series.notna().any() \
+        and pd.to_datetime(series).dt.tz is None
+
+
+def _encode_column(series, binary_format):
+    """
+    1列分の値をバイナリ表現に変換
+
+    値のバイト列(NULL以外を連結したuint8配列)と、各行のバイト長(NULLは-1)を返す
+    """
+    null_mask = series.isna().to_numpy()
+    valid = ~null_mask
+    # 文字列型(可変長)
+    if binary_format == 'text':
+        encoded = [str(v).encode('utf-8') for v in series.to_numpy()[valid]]
+        lengths = np.full(len(series), -1, dtype=np.int64)
+        lengths[valid] = [len(b) for b in encoded]
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), lengths
+    # 日時型(2000-01-01からのマイクロ秒数 or 日数)。テキスト形式の`COPY`、`to_sql`と同じ値になるよう、
+    # timestamptzはUTCに変換し、timestamp, dateはタイムゾーン付きの値も現地時刻のまま転送する
+    if binary_format in ('timestamp', 'timestamptz', 'date'):
+        dt = pd.to_datetime(series)
+        if binary_format == 'timestamptz':
+            if dt.dt.tz is None and valid.any():
+                raise Exception(f'Column `{series.name}` has datetimes without time zone for timestamptz, '
+                                'so binary COPY cannot interpret them in the session time zone. '
+                                'Localize them or use `method="copy"` instead.')
+            if dt.dt.tz is not None:
+                dt = dt.dt.tz_convert('UTC')
+        if dt.dt.tz is not None:
+            dt = dt.dt.tz_localize(None)
+        values = dt.to_numpy(dtype='datetime64[us]')[valid]
+        if binary_format in ('timestamp', 'timestamptz'):
+            values = (values - POSTGRES_EPOCH).astype(np.int64)
+        else:
+            values = (values.astype('datetime64[D]') - POSTGRES_EPOCH.astype('datetime64[D]')).astype(np.int64)
+    # 真偽値型(真偽値、または0/1の値のみ受け付ける)
+    elif binary_format == 'bool':
+        if not pd.api.types.is_bool_dtype(series.dtype):
+            values = series.to_numpy()[valid]
+            if not all(isinstance(v, (bool, np.bool_, int, np.integer, float, np.floating)) and v in (0, 1)
+                       for v in values):
+                raise Exception(f'Column `{series.name}` has values other than booleans or 0/1, '
+                                'so binary COPY cannot convert them. Use `method="copy"` instead.')
+        values = series.to_numpy(dtype=np.bool_, na_value=False)[valid]
+    # 整数型(小数部の有無と桁あふれを確認してから変換)
+    elif binary_format.startswith('int'):
+        if not (pd.api.types.is_integer_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype)):
+            original = series.to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+            if np.any(~np.isfinite(original) | (original != np.trunc(original))):
+                raise Exception(f'Column `{series.name}` has non-integer values for {binary_format}, '
+                                'so binary COPY cannot convert them. Use `method="copy"` instead.')
+        else:
+            original = series.to_numpy()[valid]
+        # int64への変換で桁あふれする値(uint64の大きな値等)があるため、変換前の値で範囲を確認
+        info = np.iinfo(_FIXED_WIDTH_FORMATS[binary_format].lstrip('>'))
+        if len(original) > 0 and (int(original.min()) < info.min or int(original.max()) > info.max):
+            raise Exception(f'Column `{series.name}` has values out of range of {binary_format}.')
+        values = series.to_numpy(dtype=np.int64, na_value=0)[valid]
+    # 浮動小数点型(単精度への変換で桁あふれする値を確認)
+    else:
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+        with np.errstate(over='ignore'):
+            cast = values.astype(_FIXED_WIDTH_FORMATS[binary_format])
+        if np.any(np.isfinite(values) & ~np.isfinite(cast)):
+            raise Exception(f'Column `{series.name}` has values out of range of {binary_format}.')
+        values = cast
+    values = values.astype(_FIXED_WIDTH_FORMATS[binary_format])
+    lengths = np.where(null_mask, -1, values.dtype.itemsize).astype(np.int64)
+    return values.view(np.uint8).ravel(), lengths
+
+
+def encode_binary_copy(df, column_types):
+    """
+    pandas.DataFrameをPostgreSQLのバイナリCOPY形式(`COPY ... FROM STDIN WITH (FORMAT binary)`)に変換
+
+    列単位でNumPyのベクトル演算により変換するため、値をテキスト化せずに転送できる
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        変換対象のDataFrame(NaN、None、pandas.NAはNULLとして扱う)
+
+    column_types : list[sqlalchemy.types.TypeEngine]
+        `df`の各列に対応する転送先テーブルの列の型(バイナリ形式は転送先の型と厳密に一致させる必要がある)
+
+        Float(REAL), Integer, BigInteger, SmallInteger, Boolean, String, DateTime, Dateに対応
+        (timestamptzの列はタイムゾーン付きの日時のみ受け付けてUTCに変換し、timestamp, dateの列は現地時刻のまま転送)
+
+    Returns
+    ----------
+    bytes
+        バイナリCOPY形式のデータ(ヘッダおよびトレーラを含む)
+    """
+    n_rows = len(df)
+    # 各列をバイナリ化
+    encoded_columns = [_encode_column(df.iloc[:, i], _get_binary_format(t))
+                       for i, t in enumerate(column_types)]
+    # 各行のバイト数(フィールド数2byte + 各列の長さ4byte + 値)から、各行の書込開始位置を算出
+    row_sizes = np.full(n_rows, 2, dtype=np.int64)
+    for _, lengths in encoded_columns:
+        row_sizes += 4 + np.maximum(lengths, 0)
+    row_offsets = len(BINARY_COPY_HEADER) + np.cumsum(row_sizes) - row_sizes
+    total_size = len(BINARY_COPY_HEADER) + int(row_sizes.sum()) + len(BINARY_COPY_TRAILER)
+    buf = np.empty(total_size, dtype=np.uint8)
+    buf[:len(BINARY_COPY_HEADER)] = np.frombuffer(BINARY_COPY_HEADER, dtype=np.uint8)
+    buf[total_size - len(BINARY_COPY_TRAILER):] = np.frombuffer(BINARY_COPY_TRAILER, dtype=np.uint8)
+    # フィールド数を書込
+    n_fields = np.frombuffer(np.array(len(column_types), dtype='>i2').tobytes(), dtype=np.uint8)
+    buf[row_offsets[:, None] + np.arange(2)] = n_fields
+    position = row_offsets + 2
+    # 各列の長さと値を書込
+    for data, lengths in encoded_columns:
+        buf[position[:, None] + np.arange(4)] = lengths.astype('>i4').view(np.uint8).reshape(-1, 4)
+        valid_lengths = lengths[lengths >= 0]
+        if len(data) > 0:
+            # 値の書込先インデックス(各行の値の開始位置 + 値内の相対位置)
+            starts = position[lengths >= 0] + 4
+            data_offsets = np.cumsum(valid_lengths) - valid_lengths
+            dst = np.repeat(starts - data_offsets, valid_lengths) + np.arange(len(data))
+            buf[dst] = data
+        position += 4 + np.maximum(lengths, 0)
+    return buf.tobytes()
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import pandas as pd
+
+# SQL文を字句に分割する正規表現(コメント、文字列リテラル、クオートした識別子、単語、記号)
+_TOKEN_PATTERN = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\w+|\S", re.DOTALL)
+# FROM句を終了させるキーワード
+_FROM_END_KEYWORDS = {'where', 'group', 'having', 'window', 'order', 'limit', 'offset', 'fetch', 'for',
+                      'union', 'intersect', 'except', 'returning', 'set', 'values', 'select'}
+# FROM句の項目の前に付くキーワード
+_FROM_ITEM_PREFIXES = {'only', 'lateral'}
+
+
+def _extract_tables_from_text(sql_text):
+    """
+    生SQLの文字列から参照しているテーブル名を抽出(FROM句のカンマ区切りの項目とJOIN句の対象。判定できなければNone)
+    """
+    tokens = [t for t in _TOKEN_PATTERN.findall(sql_text) if not t.startswith(('--', '/*'))]
+    tables = set()
+    # 括弧の深さごとに、FROM句の項目の並びの中にいるか
+    in_from = [False]
+    expect_item = False
+    for i, token in enumerate(tokens):
+        word = token.lower()
+        # FROM, JOIN, FROM句中のカンマの直後はテーブル名(またはサブクエリ、関数)
+        if expect_item:
+            expect_item = False
+            if word in _FROM_ITEM_PREFIXES:
+                expect_item = True
+                continue
+            if token.startswith('"') or re.fullmatch(r'[A-Za-z_]\w*', token):
+                # スキーマ名付きの名前は最後の部分をテーブル名とする
+                j = i
+                while j + 2 < len(tokens) and tokens[j + 1] == '.':
+                    j += 2
+                is_function = j + 1 < len(tokens) and tokens[j + 1] == '('
+                if not is_function:
+                    name = tokens[j]
+                    tables.add(name[1:-1].replace('""', '"').lower() if name.startswith('"') else name.lower())
+            # "EXTRACT(YEAR FROM ts)", "substring(s FROM 1)"等の関数の引数はテーブルではない
+            elif token.startswith("'") or token[0].isdigit() or token == '%':
+                pass
+            elif token != '(':
+                return None
+        if token == '(':
+            in_from.append(False)
+        elif token == ')':
+            if len(in_from) > 1:
+                in_from.pop()
+        elif word == 'from':
+            in_from[-1] = True
+            expect_item = True
+        elif word == 'join':
+            expect_item = True
+        elif token == ',' and in_from[-1]:
+            expect_item = True
+        elif word in _FROM_END_KEYWORDS:
+            in_from[-1] = False
+    if expect_item:
+        return None
+    return tables
+
+
+def _extract_tables(sql):
+    """
+    SQL(生SQL、SQL Expression Language、ORM)から参照しているテーブル名を抽出(スキーマ名は除き、小文字で返す)
+
+    SQL Expression Language, ORMの構文は構文木に含まれるテーブルを、生SQLはFROM句とJOIN句を解析して抽出する。
+    参照しているテーブルを判定できなければNoneを返す
+    """
+    if isinstance(sql, str):
+        tables = _extract_tables_from_text(sql)
+    else:
+        from sqlalchemy.sql import visitors
+        from sqlalchemy.sql.expression import Select, TableClause, TextClause
+        tables = set()
+        from_texts = set()
+        for element in visitors.iterate(sql):
+            if isinstance(element, TableClause):
+                tables.add(element.name.lower())
+            # `select_from(text(...))`で指定したFROM句の項目を記録
+            elif isinstance(element, Select):
+                from_texts |= {id(f) for f in element.get_final_froms() if isinstance(f, TextClause)}
+            # `text()`で記述した部分は文字列として解析
+            elif isinstance(element, TextClause):
+                text = f'FROM {element.text}' if id(element) in from_texts else element.text
+                text_tables = _extract_tables_from_text(text)
+                if text_tables is None:
+                    return None
+                tables |= text_tables
+    return sorted(tables) if tables is not None else None
+
+
+class QueryResultCache():
+    def __init__(self, cache_dir, max_bytes=1024 ** 3, ttl=None):
+        """
+        `PandaAlchemy.read_sql_query`の結果をParquetファイルとしてローカルディスクに保持するキャッシュ
+
+        合計サイズが`max_bytes`を超えたら最も長く参照されていない結果から破棄する(pyarrowが必要)
+
+        Parameters
+        ----------
+        cache_dir : str
+            キャッシュを保存するディレクトリ(存在しない場合は作成)
+
+        max_bytes : int, default=1024**3
+            キャッシュの合計サイズの上限(バイト)
+
+        ttl : float, default=None
+            キャッシュの有効期間(秒)。Noneなら無期限
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(cache_dir, 'index.json')
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        # 既存のキャッシュ一覧を読込
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        else:
+            self._index = {}
+
+    def _save_index(self):
+        """
+        キャッシュ一覧をファイルに保存(書込途中のファイルを読まれないよう一時ファイルから置換)
+        """
+        tmp_path = f'{self._index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _remove(self, key):
+        """
+        キャッシュを1件削除
+        """
+        entry = self._index.pop(key)
+        path = os.path.join(self.cache_dir, entry['file'])
+        if os.path.exists(path):
+            os.remove(path)
+
+    def make_key(self, sql_text, params=None, dtype_dict=None, **options):
+        """
+        コンパイル済のSQL文、パラメータ、dtype_dict等からキャッシュのキーを作成
+        """
+        source = repr((sql_text, sorted(params.items()) if isinstance(params, dict) else params,
+                       sorted((k, repr(v)) for k, v in dtype_dict.items()) if dtype_dict is not None else None,
+                       sorted((k, repr(v)) for k, v in options.items())))
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        キャッシュからDataFrameを取得(存在しない、または期限切れならNone)
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None and self.ttl is not None and entry['created'] + self.ttl < time.time():
+                self._remove(key)
+                self._save_index()
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            try:
+                df = pd.read_parquet(os.path.join(self.cache_dir, entry['file']))
+                if entry.get('index'):
+                    df = df.set_index(entry['index'])
+                    df.index.names = entry['index_names']
+            # ファイルが削除されていた場合等は、キャッシュなしとして扱う
+            except (OSError, ValueError):
+                self._remove(key)
+                self._save_index()
+                self._stats['misses'] += 1
+                return None
+            # 参照のたびにファイルへ書き込まないよう、参照時刻はメモリ上のみ更新(保存・破棄時にファイルに反映)
+            entry['last_access'] = time.time()
+            self._stats['hits'] += 1
+            return df
+
+    def put(self, key, df, tables):
+        """
+        DataFrameをキャッシュに保存(Parquetに変換できない列を含むDataFrameはキャッシュしない)
+
+        Parameters
+        ----------
+        key : str
+            キャッシュのキー(`make_key`の出力)
+
+        df : pandas.DataFrame
+            保存するDataFrame
+
+        tables : list[str]
+            クエリが参照しているテーブル名のリスト(`invalidate_table`での破棄に使用。ビュー等を参照するクエリは、
+            元のテーブルの変更で破棄されないため保存しないこと)
+        """
+        file_name = f'{key}.parquet'
+        path = os.path.join(self.cache_dir, file_name)
+        # 連番以外のインデックスは列として保存(Arrowの型のインデックスもParquetで型を保持できるよう)
+        index_names = None
+        if not (isinstance(df.index, pd.RangeIndex) and df.index.name is None):
+            index_names = list(df.index.names)
+            df = df.reset_index()
+        try:
+            df.to_parquet(path)
+        except (TypeError, ValueError, ImportError) as e:
+            print(f'The query result is not cached because it cannot be saved as Parquet ({e})')
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        now = time.time()
+        with self._lock:
+            if key in self._index and self._index[key]['file'] != file_name:
+                self._remove(key)
+            self._index[key] = {'file': file_name, 'tables': [t.lower() for t in tables],
+                                'index': index_names and [str(c) for c in df.columns[:len(index_names)]],
+                                'index_names': index_names,
+                                'size': os.path.getsize(path), 'created': now, 'last_access': now}
+            # 合計サイズが上限を超えたら、最も長く参照されていないものから破棄
+            total = sum(entry['size'] for entry in self._index.values())
+            for old_key in sorted(self._index, key=lambda k: self._index[k]['last_access']):
+                if total <= self.max_bytes:
+                    break
+                total -= self._index[old_key]['size']
+                self._remove(old_key)
+                self._stats['evictions'] += 1
+            self._save_index()
+
+    def invalidate_table(self, table_name):
+        """
+        指定したテーブルを参照しているキャッシュを破棄
+
+        Parameters
+        ----------
+        table_name : str
+            データが変更されたテーブル名
+        """
+        name = table_name.split('.')[-1].strip('"').lower()
+        with self._lock:
+            keys = [k for k, entry in self._index.items() if name in entry['tables']]
+            for key in keys:
+                self._remove(key)
+            self._stats['invalidations'] += len(keys)
+            if len(keys) > 0:
+                self._save_index()
+
+    def clear(self):
+        """
+        全てのキャッシュを破棄
+        """
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self._save_index()
+
+    def stats(self):
+        """
+        キャッシュのヒット数等の統計情報をdictで取得
+
+        "hits": ヒット数, "misses": ミス数, "hit_rate": ヒット率, "evictions": サイズ上限による破棄数,
+        "invalidations": テーブル変更による破棄数, "entries": 保持件数, "bytes": 合計サイズ
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            n_requests = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / n_requests if n_requests > 0 else None
+            stats['entries'] = len(self._index)
+            stats['bytes'] = sum(entry['size'] for entry in self._index.values())
+        return stats
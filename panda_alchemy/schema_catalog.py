@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import OrderedDict
+import sqlalchemy
+from sqlalchemy import Table, MetaData
+
+from .result_cache import _extract_tables
+
+# クエリ結果の列の元テーブルから、NOT NULL制約と統計情報(値の種類数の推定値、テーブルの行数の推定値)を取得するSQL
+_COLUMN_STATS_SQL = '''
+SELECT a.attrelid, a.attnum, a.attnotnull, s.n_distinct, c.reltuples
+FROM pg_attribute AS a
+JOIN pg_class AS c ON c.oid = a.attrelid
+JOIN pg_namespace AS n ON n.oid = c.relnamespace
+LEFT JOIN pg_stats AS s ON s.schemaname = n.nspname AND s.tablename = c.relname AND s.attname = a.attname AND NOT s.inherited
+WHERE a.attrelid = ANY(%s::oid[]) AND a.attnum > 0
+'''
+
+
+class SchemaCatalog():
+    def __init__(self, engine, ttl=60, maxsize=128):
+        """
+        テーブル単位でスキーマ情報を取得し、TTL付きのLRUキャッシュに保持するクラス
+
+        DB全体をリフレクションせず、必要なテーブルのみを問い合わせる
+
+        Parameters
+        ----------
+        engine : sqlalchemy.engine.Engine
+            問い合わせに使用するengine
+
+        ttl : float, default=60
+            キャッシュの有効期間(秒)。Noneなら無期限(DB外部でのスキーマ変更は`invalidate`で反映)
+
+        maxsize : int, default=128
+            キャッシュに保持する最大件数(超えたら最も長く使われていないものから破棄)
+        """
+        self.engine = engine
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache = OrderedDict()  # (種類, スキーマ名, テーブル名) → (有効期限, 値)
+        self._lock = threading.Lock()
+
+    def _get(self, key, loader):
+        """
+        キャッシュから値を取得し、なければ(または期限切れなら)`loader`で取得してキャッシュ
+        """
+        with self._lock:
+            if key in self._cache:
+                expires, value = self._cache[key]
+                if expires is None or expires > time.monotonic():
+                    self._cache.move_to_end(key)
+                    return value
+                del self._cache[key]
+        value = loader()
+        with self._lock:
+            self._cache[key] = (None if self.ttl is None else time.monotonic() + self.ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return value
+
+    def has_table(self, table_name, schema=None):
+        """
+        テーブルの存在有無を確認
+
+        Parameters
+        ----------
+        table_name : str
+            存在有無を確認したいテーブル名
+
+        schema : str, default=None
+            スキーマ名(Noneならデフォルトのスキーマ)
+        """
+        return self._get(('has_table', schema, table_name),
+                         lambda: sqlalchemy.inspect(self.engine).has_table(table_name, schema=schema))
+
+    def is_base_table(self, table_name, schema=None):
+        """
+        通常のテーブル(パーティションテーブルを含む。ビュー、マテリアライズドビュー、外部テーブル等は除く)か確認(PostgreSQLのみ)
+
+        Parameters
+        ----------
+        table_name : str
+            確認したいテーブル名
+
+        schema : str, default=None
+            スキーマ名(Noneならsearch_pathから検索)
+        """
+        return self._get(('is_base_table', schema, table_name), lambda: self._load_is_base_table(table_name, schema))
+
+    def _load_is_base_table(self, table_name, schema):
+        """
+        `pg_class`からテーブルの種類を取得し、通常のテーブルか判定
+        """
+        quote = self.engine.dialect.identifier_preparer.quote_identifier
+        name = f'{quote(schema)}.{quote(table_name)}' if schema is not None else quote(table_name)
+        with self.engine.connect() as conn:
+            relkind = conn.execute(sqlalchemy.text('SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)'),
+                                   {'name': name}).scalar()
+        return relkind in ('r', 'p')
+
+    def get_table(self, table_name, schema=None):
+        """
+        1テーブルのみをリフレクションし、`sqlalchemy.Table`として取得
+
+        Parameters
+        ----------
+        table_name : str
+            取得したいテーブル名
+
+        schema : str, default=None
+            スキーマ名(Noneならデフォルトのスキーマ)
+        """
+        return self._get(('table', schema, table_name),
+                         lambda: Table(table_name, MetaData(), schema=schema, autoload_with=self.engine))
+
+    def get_columns(self, table_name, schema=None):
+        """
+        テーブルの列名と型(`sqlalchemy.types`のメンバ)の組み合わせをdictで取得
+
+        Parameters
+        ----------
+        table_name : str
+            取得したいテーブル名
+
+        schema : str, default=None
+            スキーマ名(Noneならデフォルトのスキーマ)
+        """
+        table = self.get_table(table_name, schema=schema)
+        return {column.name: column.type for column in table.columns}
+
+    def get_query_columns(self, sql_text, params=None):
+        """
+        SQLクエリの結果の各列の情報をリストで取得(PostgreSQLのみ。クエリは結果を0行に制限して実行)
+
+        各列は"name": 列名, "type_code": 型のOID, "nullable": NULLを含み得るか(テーブルの列でNOT NULL制約があればFalse),
+        "n_distinct": 値の種類数の推定値(`pg_stats`から算出。テーブルの列でない、または統計情報がなければNone),
+        "rows": 元テーブルの行数の推定値(不明ならNone) のdict
+
+        キャッシュのキーは`sql_text`のみのため、`params`の値が異なっても同じ結果を返す
+
+        Parameters
+        ----------
+        sql_text : str
+            SQL文(プレースホルダはpsycopg2の形式)
+
+        params : list, tuple or dict, default=None
+            プレースホルダに渡す値
+        """
+        return self._get(('query_columns', None, sql_text), lambda: self._load_query_columns(sql_text, params))
+
+    def _load_query_columns(self, sql_text, params):
+        """
+        SQLクエリの結果の列の型と、元テーブルのNOT NULL制約・統計情報を取得
+        """
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            query = sql_text if params is None else cursor.mogrify(sql_text, params)
+            if isinstance(query, bytes):
+                query = query.decode('utf-8')
+            cursor.execute(f'SELECT * FROM ({query.strip().rstrip(";")}) AS _pdalchemy_query LIMIT 0')
+            description = cursor.description
+            # 元テーブルの列の情報を取得((テーブルのOID, 列番号) → 情報)
+            stats = {}
+            table_oids = sorted({column.table_oid for column in description if column.table_oid})
+            if len(table_oids) > 0:
+                cursor.execute(_COLUMN_STATS_SQL, (table_oids,))
+                for table_oid, column_number, not_null, n_distinct, reltuples in cursor.fetchall():
+                    # n_distinctが負の値のときは行数に対する割合
+                    if n_distinct is not None and n_distinct < 0:
+                        n_distinct = -n_distinct * reltuples if reltuples > 0 else None
+                    stats[(table_oid, column_number)] = (not not_null, n_distinct, reltuples)
+            cursor.close()
+            conn.rollback()  # 読込のみのため、トランザクションは破棄
+        finally:
+            conn.close()
+        columns = []
+        for column in description:
+            nullable, n_distinct, reltuples = stats.get((column.table_oid, column.table_column), (True, None, None))
+            columns.append({'name': column.name, 'type_code': column.type_code, 'nullable': nullable,
+                            'n_distinct': n_distinct, 'rows': reltuples if reltuples is not None and reltuples >= 0 else None})
+        return columns
+
+    @staticmethod
+    def _refers_to(sql_text, name):
+        """
+        SQL文がテーブルを参照しているか(参照テーブルを判定できないSQLは参照しているとみなす)
+        """
+        tables = _extract_tables(sql_text)
+        return tables is None or name in tables
+
+    def invalidate(self, table_name=None, schema=None):
+        """
+        キャッシュを破棄
+
+        Parameters
+        ----------
+        table_name : str, default=None
+            破棄したいテーブル名(Noneなら全テーブル)
+
+        schema : str, default=None
+            スキーマ名(Noneならデフォルトのスキーマ)
+        """
+        with self._lock:
+            if table_name is None:
+                self._cache.clear()
+            else:
+                # テーブルの情報と、テーブルを参照しているクエリ(参照テーブルが不明なものを含む)の結果の列の情報を破棄
+                name = table_name.lower()
+                for key in [k for k in self._cache
+                            if (k[1] == schema and k[2] == table_name)
+                            or (k[0] == 'query_columns' and self._refers_to(k[2], name))]:
+                    del self._cache[key]
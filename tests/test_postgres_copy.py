@@ -0,0 +1,27 @@
+import pandas as pd
+
+from panda_alchemy.postgres_copy import parse_copy_datetime
+
+
+def test_parse_copy_datetime_mixed_fractional_seconds():
+    # 小数秒が0の値は小数部が省略されて出力される
+    values = pd.Series(['2020-01-01 00:00:00', '2020-01-02 03:04:05.123', None])
+    parsed = parse_copy_datetime(values, 1114)
+    assert parsed.dtype == 'datetime64[ns]'
+    assert parsed[0] == pd.Timestamp('2020-01-01 00:00:00')
+    assert parsed[1] == pd.Timestamp('2020-01-02 03:04:05.123')
+    assert pd.isna(parsed[2])
+
+
+def test_parse_copy_datetime_timestamptz_mixed_offsets():
+    values = pd.Series(['2020-01-01 09:00:00+09', '2020-01-01 00:00:00.5+00', '2020-01-01 05:30:00+05:30'])
+    parsed = parse_copy_datetime(values, 1184)
+    assert str(parsed.dt.tz) == 'UTC'
+    assert parsed.tolist() == [pd.Timestamp('2020-01-01 00:00:00', tz='UTC'),
+                               pd.Timestamp('2020-01-01 00:00:00.5', tz='UTC'),
+                               pd.Timestamp('2020-01-01 00:00:00', tz='UTC')]
+
+
+def test_parse_copy_datetime_date():
+    parsed = parse_copy_datetime(pd.Series(['2020-01-01', '2021-12-31']), 1082)
+    assert parsed.tolist() == [pd.Timestamp('2020-01-01'), pd.Timestamp('2021-12-31')]